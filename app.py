@@ -1,11 +1,15 @@
-from flask import Flask
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 from routes.auth import auth_bp
 from routes.upload import upload_bp
 from routes.rfm import rfm_bp
 from routes.user import user_bp
 import os
-from config import UPLOAD_DIR
+from config import UPLOAD_DIR, RFM_TRACE_LOG, db_pool
+from model_registry import registry
+from password_hasher import password_hasher
+from jobs import job_manager
+from instrumentation import stage_metrics, render_gauges, enable_trace_log
 
 app = Flask(__name__)
 CORS(app)
@@ -14,10 +18,42 @@ app.register_blueprint(auth_bp, url_prefix="/api/auth")
 app.register_blueprint(upload_bp, url_prefix="/api")
 app.register_blueprint(rfm_bp, url_prefix="/api/rfm")
 app.register_blueprint(user_bp, url_prefix="/api/user")
+
+
+@app.get("/api/stats/db-pool")
+def db_pool_stats():
+    return jsonify(db_pool.stats())
+
+
+@app.get("/api/stats/auth-hasher")
+def auth_hasher_stats():
+    return jsonify(password_hasher.stats())
+
+
+@app.get("/metrics")
+def metrics():
+    body = (
+        stage_metrics.render()
+        + render_gauges("rfm_db_pool", db_pool.stats())
+        + render_gauges("rfm_auth_hasher", password_hasher.stats())
+        + render_gauges("rfm_jobs", job_manager.stats())
+    )
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+if RFM_TRACE_LOG:
+    enable_trace_log()
+
+
 print(app.url_map)
 
 # ensure upload dir exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# load models once per worker so the first request does not pay for it
+model_errors = registry.warm()
+if model_errors:
+    print("Model warm-up failed:", model_errors)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
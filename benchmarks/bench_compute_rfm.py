@@ -0,0 +1,95 @@
+"""
+Benchmark + equivalence check for rfm_pipeline.compute_rfm.
+
+Compares the vectorized compute_rfm with the original per-group lambda
+implementation on synthetic cleaned transactions and fails if the two
+tables are not exactly equal.
+
+    python -m benchmarks.bench_compute_rfm --rows 1000000,10000000,50000000
+"""
+import time
+import argparse
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+from rfm_pipeline import compute_rfm
+
+
+def compute_rfm_legacy(df, reference_date=None):
+    """compute_rfm as it was before vectorization (Python lambda per customer)."""
+    if reference_date is None:
+        reference_date = df["InvoiceDate"].max() + dt.timedelta(days=1)
+
+    rfm = df.groupby("CustomerID").agg({
+        "InvoiceDate": lambda x: (reference_date - x.max()).days,
+        "InvoiceNo": "nunique",
+        "Amount": "sum"
+    }).reset_index()
+
+    rfm.columns = ["CustomerID", "Recency", "Frequency", "Monetary"]
+    return rfm
+
+
+def make_clean_transactions(n_rows, n_customers=None, seed=42):
+    """Synthetic basic_cleaning() output: one row per invoice line."""
+    rng = np.random.default_rng(seed)
+    n_customers = n_customers or max(n_rows // 100, 10)
+    n_invoices = max(n_rows // 20, 1)
+
+    invoice = rng.integers(0, n_invoices, n_rows)
+    # every invoice belongs to one customer, like the real exports
+    customer = (invoice * 7919 % n_customers + 12000).astype("float64")
+    start = np.datetime64("2010-12-01T00:00")
+    minutes = rng.integers(0, 365 * 24 * 60, n_rows)
+
+    quantity = rng.integers(1, 50, n_rows)
+    price = np.round(rng.random(n_rows) * 20 + 0.1, 2)
+    return pd.DataFrame({
+        "InvoiceNo": (invoice + 536365).astype(str),
+        "InvoiceDate": start + minutes.astype("timedelta64[m]"),
+        "CustomerID": customer,
+        "Quantity": quantity,
+        "UnitPrice": price,
+        "Amount": quantity * price,
+    })
+
+
+def run(rows, skip_legacy=False):
+    df = make_clean_transactions(rows)
+
+    start = time.perf_counter()
+    new = compute_rfm(df)
+    t_new = time.perf_counter() - start
+
+    result = {"rows": rows, "customers": len(new), "vectorized_s": round(t_new, 3)}
+    if skip_legacy:
+        return result
+
+    start = time.perf_counter()
+    old = compute_rfm_legacy(df)
+    t_old = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(new, old, check_exact=True)
+    result.update({
+        "legacy_s": round(t_old, 3),
+        "speedup": round(t_old / t_new, 1) if t_new else None,
+        "equal": True,
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compute_rfm benchmark")
+    parser.add_argument("--rows", default="1000000,10000000,50000000",
+                        help="Comma separated row counts")
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="Only time the vectorized path")
+    args = parser.parse_args()
+
+    for rows in [int(r) for r in args.rows.split(",")]:
+        print(run(rows, args.skip_legacy))
+
+
+if __name__ == "__main__":
+    main()
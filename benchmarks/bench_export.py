@@ -0,0 +1,128 @@
+"""
+Serialization cost of the /api/rfm/results formats.
+
+Synthetic rfm_results rows (dicts for the text formats, tuples for the
+binary ones, as the cursors return them) are encoded with the same
+functions the endpoint uses, then decoded into a pandas DataFrame the
+way a client would. Database time is left out: it is the same for every
+format.
+
+    python -m benchmarks.bench_export --rows 1000000
+    python -m benchmarks.bench_export --rows 200000 --out export.json
+"""
+import io
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_pipeline import metadata
+from results_query import (
+    RESULT_FIELDS, EXPORT_BATCH_ROWS, project, ndjson_chunks, csv_chunks,
+    arrow_chunks, parquet_chunks,
+)
+
+FORMATS = ["json", "ndjson", "csv", "arrow", "parquet"]
+
+
+def make_rows(n, seed=42):
+    rng = np.random.default_rng(seed)
+    columns = ["id"] + RESULT_FIELDS
+    rows = list(zip(
+        range(1, n + 1),
+        (str(12000 + i) for i in range(n)),
+        rng.integers(1, 400, n).tolist(),
+        rng.integers(1, 60, n).tolist(),
+        np.round(rng.gamma(0.6, 900, n), 2).tolist(),
+        rng.integers(0, 5, n).tolist(),
+    ))
+    return columns, rows
+
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def encode(fmt, columns, rows, dict_rows):
+    fields = RESULT_FIELDS
+    if fmt == "json":
+        # what jsonify does with the non-paginated body
+        return json.dumps({
+            "message": "success", "total": len(dict_rows),
+            "data": [project(r, fields) for r in dict_rows],
+        }).encode()
+    if fmt == "ndjson":
+        return "".join(ndjson_chunks(_batches(dict_rows, 1000), fields)).encode()
+    if fmt == "csv":
+        return "".join(csv_chunks(_batches(dict_rows, 1000), fields)).encode()
+    chunks = arrow_chunks if fmt == "arrow" else parquet_chunks
+    return b"".join(chunks(_batches(rows, EXPORT_BATCH_ROWS), columns, fields))
+
+
+def decode(fmt, body):
+    if fmt == "json":
+        return pd.DataFrame(json.loads(body)["data"])
+    if fmt == "ndjson":
+        return pd.read_json(io.BytesIO(body), lines=True, dtype={"customer_id": str})
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(body), dtype={"customer_id": str})
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        return pa.ipc.open_stream(body).read_all().to_pandas()
+    import pyarrow.parquet as pq
+
+    return pq.read_table(io.BytesIO(body)).to_pandas()
+
+
+def measure(n, repeat=1):
+    columns, rows = make_rows(n)
+    dict_rows = [dict(zip(columns, r)) for r in rows]
+    results = []
+    for fmt in FORMATS:
+        encode_s, decode_s = [], []
+        for _ in range(repeat):
+            start = time.process_time()
+            body = encode(fmt, columns, rows, dict_rows)
+            encode_s.append(time.process_time() - start)
+            start = time.process_time()
+            df = decode(fmt, body)
+            decode_s.append(time.process_time() - start)
+        assert len(df) == n, fmt
+        results.append({
+            "format": fmt,
+            "bytes": len(body),
+            "encode_cpu_seconds": round(min(encode_s), 4),
+            "decode_cpu_seconds": round(min(decode_s), 4),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Results export format benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Scored customers")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per format (best kept)")
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args()
+
+    results = measure(args.rows, args.repeat)
+    base = results[0]
+    print(f"{args.rows:,} rows")
+    print(f"{'format':<8} {'MB':>8} {'encode s':>9} {'decode s':>9} {'vs json (bytes / encode)':>26}")
+    for r in results:
+        ratio = (f"{base['bytes'] / r['bytes']:.1f}x / "
+                 f"{base['encode_cpu_seconds'] / max(r['encode_cpu_seconds'], 1e-9):.1f}x")
+        print(f"{r['format']:<8} {r['bytes'] / 1e6:>8.1f} {r['encode_cpu_seconds']:>9.3f} "
+              f"{r['decode_cpu_seconds']:>9.3f} {ratio:>26}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": metadata(), "rows": args.rows, "results": results}, f, indent=2)
+        print("Results saved to:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Stage-by-stage time and memory benchmark of the RFM pipeline.
+
+For each scale a synthetic CSV is written (see benchmarks.synthetic) and
+load_data, basic_cleaning, compute_rfm, cap_and_log_transform,
+model.predict and the rfm_results insert path (SQLite in-memory stand-in)
+are timed; peak traced allocations are recorded per stage. Results are
+saved as JSON and can be compared against an earlier run.
+
+    python -m benchmarks.bench_pipeline --rows 100000,1000000 --out bench.json
+    python -m benchmarks.bench_pipeline --rows 100000,1000000 --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import tempfile
+import datetime as dt
+import subprocess
+import tracemalloc
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from rfm_pipeline import load_data, basic_cleaning, compute_rfm, cap_and_log_transform
+from rfm_writer import write_rfm_results
+from benchmarks.synthetic import generate_transactions, write_transactions
+
+RESULTS_SCHEMA = """
+    CREATE TABLE rfm_results (
+        id INTEGER PRIMARY KEY,
+        file_id INT NOT NULL,
+        customer_id VARCHAR(100) NOT NULL,
+        recency INT,
+        frequency INT,
+        monetary DOUBLE,
+        cluster INT
+    )
+"""
+
+
+def _measure(fn, repeat, trace):
+    """Best-of-`repeat` wall time, then one traced run for the peak."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak_mb = None
+    if trace:
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return out, best, peak_mb
+
+
+def _insert(rfm_proc):
+    conn = sqlite3.connect(":memory:")
+    conn.execute(RESULTS_SCHEMA)
+    try:
+        return write_rfm_results(conn, 1, rfm_proc, method="insert")
+    finally:
+        conn.close()
+
+
+def run_scale(rows, customers, model, workdir, repeat=1, trace=True):
+    path = os.path.join(workdir, f"synthetic_{rows}.csv")
+    if not os.path.exists(path):
+        write_transactions(generate_transactions(rows, customers), path)
+
+    steps = [
+        ("load_data", lambda: load_data(path, use_cache=False)),
+        ("basic_cleaning", lambda: basic_cleaning(data["load_data"])),
+        ("compute_rfm", lambda: compute_rfm(data["basic_cleaning"])),
+        ("cap_and_log_transform", lambda: cap_and_log_transform(data["compute_rfm"])),
+        ("predict", lambda: model.predict(data["cap_and_log_transform"][2])),
+        ("insert", lambda: _insert(scored)),
+    ]
+
+    data = {}
+    results = []
+    scored = None
+    for stage, fn in steps:
+        if stage == "insert":
+            scored = data["cap_and_log_transform"][0].copy()
+            scored["cluster"] = data["predict"]
+        out, seconds, peak_mb = _measure(fn, repeat, trace)
+        data[stage] = out
+        results.append({
+            "rows": rows,
+            "stage": stage,
+            "seconds": round(seconds, 4),
+            "peak_mb": None if peak_mb is None else round(peak_mb, 1),
+            "output_rows": len(out[0]) if isinstance(out, tuple) else (
+                out["rows"] if isinstance(out, dict) else len(out)
+            ),
+        })
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def compare(current, baseline, tolerance, min_seconds=0.01):
+    """
+    Print per-stage time ratios; return the stages slower than tolerance.
+    Stages faster than `min_seconds` in the baseline are too noisy to flag.
+    """
+    base = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"{'rows':>10} {'stage':<22} {'base s':>9} {'now s':>9} {'ratio':>7}")
+    for r in current["results"]:
+        b = base.get((r["rows"], r["stage"]))
+        if b is None or not b["seconds"]:
+            continue
+        ratio = r["seconds"] / b["seconds"]
+        slower = ratio > 1 + tolerance and b["seconds"] >= min_seconds
+        flag = " <-- slower" if slower else ""
+        print(f"{r['rows']:>10} {r['stage']:<22} {b['seconds']:>9.4f} "
+              f"{r['seconds']:>9.4f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RFM pipeline benchmark")
+    parser.add_argument("--rows", default="100000,1000000",
+                        help="Comma separated row counts (scales)")
+    parser.add_argument("--customers", type=int, default=None,
+                        help="Distinct customers per scale (default rows / 100)")
+    parser.add_argument("--model", default="model/rfm_kmeans.model",
+                        help="Scoring model used for the predict stage")
+    parser.add_argument("--repeat", type=int, default=1, help="Best-of-N timing")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc peaks")
+    parser.add_argument("--workdir", default=None,
+                        help="Where synthetic inputs are written (default: temp dir)")
+    parser.add_argument("--out", help="Write results as JSON")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown vs baseline before failing (0.2 = 20%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.01,
+                        help="Ignore slowdowns of stages faster than this in the baseline")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rfm_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    report = {"meta": metadata(), "results": []}
+    for rows in [int(r) for r in args.rows.split(",")]:
+        for result in run_scale(rows, args.customers, model, workdir,
+                                args.repeat, not args.no_memory):
+            print(result)
+            report["results"].append(result)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Results saved to:", args.out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance, args.min_seconds):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Web worker startup (import-time) report.
+
+Imports the Flask app in fresh interpreters with `python -X importtime`
+and reports the median import time, the slowest top-level imports and
+whether any training-only dependency (scikit-learn, scipy, matplotlib)
+or the Arrow cache reader (pyarrow.feather) was pulled in. Exits non-zero when a forbidden module is imported or the
+median exceeds --max-seconds, so it can guard worker cold starts in CI.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --max-seconds 1.5 --out startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+from benchmarks.bench_pipeline import metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# pyarrow itself is imported by pandas; the feather/IPC readers are not needed to boot
+FORBIDDEN = ("sklearn", "scipy", "matplotlib", "pyarrow.feather")
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(module="app", python=sys.executable):
+    """One cold import of `module` in a new interpreter."""
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+
+    # children are printed before their parent: the depth-1 rows since the
+    # previous top-level import are what `module`'s own import lines cost
+    total, top, children = None, [], []
+    for name, _, cumulative_us, depth in rows:
+        if depth == 1:
+            children.append((name, cumulative_us / 1e6))
+        elif depth == 0:
+            if name == module:
+                total, top = cumulative_us / 1e6, children
+            children = []
+    return {
+        "seconds": total or 0.0,
+        "modules": {name for name, _, _, _ in rows},
+        "top": sorted(top, key=lambda item: item[1], reverse=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Web app import-time benchmark")
+    parser.add_argument("--module", default="app", help="Module to import (default app)")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters to run")
+    parser.add_argument("--top", type=int, default=10, help="Slowest direct imports to list")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Fail when the median import time is above this")
+    parser.add_argument("--forbid", default=",".join(FORBIDDEN),
+                        help="Comma separated packages that must not be imported")
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    median = statistics.median(r["seconds"] for r in runs)
+    forbidden = [p.strip() for p in args.forbid.split(",") if p.strip()]
+    loaded = sorted(
+        p for p in forbidden
+        if any(m == p or m.startswith(p + ".") for r in runs for m in r["modules"])
+    )
+
+    each = ", ".join(f"{r['seconds']:.3f}" for r in runs)
+    print(f"import {args.module}: median {median:.3f}s over {args.repeat} runs ({each})")
+    print(f"{'module':<28} {'cumulative s':>12}")
+    for name, seconds in runs[-1]["top"][:args.top]:
+        print(f"{name:<28} {seconds:>12.3f}")
+    print("forbidden modules imported:", ", ".join(loaded) or "none")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "meta": metadata(),
+                "module": args.module,
+                "median_seconds": round(median, 4),
+                "runs_seconds": [round(r["seconds"], 4) for r in runs],
+                "top": [[n, round(s, 4)] for n, s in runs[-1]["top"][:args.top]],
+                "forbidden_imported": loaded,
+                "modules_imported": len(runs[-1]["modules"]),
+            }, f, indent=2)
+        print("Results saved to:", args.out)
+
+    if loaded or (args.max_seconds is not None and median > args.max_seconds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Load time and peak memory of the Excel ingestion paths.
+
+Each reader runs in a fresh process so peak RSS is not shared between
+them. Without --input a synthetic Online Retail-shaped sheet is written.
+
+    python -m benchmarks.bench_xlsx_load --rows 200000
+    python -m benchmarks.bench_xlsx_load --input data/Online_Retail.xlsx
+"""
+import os
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+READERS = ["pandas_read_excel", "streaming_all_columns", "streaming_rfm_columns"]
+
+
+def write_sample_xlsx(path, rows, seed=42):
+    rng = np.random.default_rng(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Online Retail")
+    ws.append(["InvoiceNo", "StockCode", "Description", "Quantity",
+               "InvoiceDate", "UnitPrice", "CustomerID", "Country"])
+    start = pd.Timestamp("2010-12-01")
+    customers = rng.integers(12000, 12000 + max(rows // 100, 10), rows)
+    for i in range(rows):
+        ws.append([
+            str(536365 + i // 20), "85123A", "WHITE HANGING HEART T-LIGHT HOLDER",
+            int(rng.integers(1, 30)),
+            (start + pd.Timedelta(minutes=int(i))).to_pydatetime(),
+            round(float(rng.random() * 10 + 0.1), 2),
+            float(customers[i]), "United Kingdom",
+        ])
+    wb.save(path)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_reader(name, path, out):
+    from xlsx_stream import read_excel_streaming, read_excel_rfm_columns
+
+    base = _peak_rss_mb()
+    start = time.perf_counter()
+    if name == "pandas_read_excel":
+        df = pd.read_excel(path)
+    elif name == "streaming_all_columns":
+        df = read_excel_streaming(path)
+    else:
+        df = read_excel_rfm_columns(path)
+    elapsed = time.perf_counter() - start
+    out.put({
+        "reader": name,
+        "rows": len(df),
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_delta_mb": round(_peak_rss_mb() - base, 1),
+    })
+
+
+def measure(path):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name in READERS:
+        out = ctx.Queue()
+        proc = ctx.Process(target=_run_reader, args=(name, path, out))
+        proc.start()
+        results.append(out.get())
+        proc.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel ingestion benchmark")
+    parser.add_argument("--input", help="Existing .xlsx file to load")
+    parser.add_argument("--rows", type=int, default=200_000,
+                        help="Rows for the synthetic sheet when --input is not given")
+    args = parser.parse_args()
+
+    if args.input:
+        path = args.input
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.xlsx")
+        print(f"Writing {args.rows:,} synthetic rows to {path}...")
+        write_sample_xlsx(path, args.rows)
+
+    for result in measure(path):
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Synthetic Online Retail-shaped transactions.
+
+Rows look like the raw export (InvoiceNo, StockCode, Description, Quantity,
+InvoiceDate, UnitPrice, CustomerID, Country), including the dirt that
+basic_cleaning removes: missing CustomerID, cancelled invoices ("C" prefix,
+negative Quantity) and zero prices.
+
+    python -m benchmarks.synthetic --rows 1000000 --customers 20000 --out data/synthetic.csv
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+STOCK = [
+    ("85123A", "WHITE HANGING HEART T-LIGHT HOLDER"),
+    ("71053", "WHITE METAL LANTERN"),
+    ("84406B", "CREAM CUPID HEARTS COAT HANGER"),
+    ("22423", "REGENCY CAKESTAND 3 TIER"),
+    ("47566", "PARTY BUNTING"),
+    ("85099B", "JUMBO BAG RED RETROSPOT"),
+]
+COUNTRIES = ["United Kingdom"] * 9 + ["Germany", "France", "EIRE", "Spain", "Netherlands"]
+
+
+def generate_transactions(rows, customers=None, lines_per_invoice=20,
+                          start="2010-12-01", end="2011-12-09",
+                          missing_customer=0.05, cancelled=0.02, zero_price=0.005,
+                          seed=42):
+    """
+    Raw transaction table with `rows` invoice lines.
+
+    Invoices average `lines_per_invoice` lines (invoice fan-out) and each
+    belongs to one customer out of `customers` (default rows // 100);
+    invoice dates are spread uniformly over [start, end).
+    """
+    rng = np.random.default_rng(seed)
+    customers = customers or max(rows // 100, 10)
+    n_invoices = max(rows // max(lines_per_invoice, 1), 1)
+
+    invoice = np.sort(rng.integers(0, n_invoices, rows))
+    invoice_customer_idx = rng.integers(0, customers, n_invoices)
+    invoice_customer = (invoice_customer_idx + 12346).astype("float64")
+    invoice_customer[rng.random(n_invoices) < missing_customer] = np.nan
+
+    start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+    span_min = max(int((end_ts - start_ts).total_seconds() // 60), 1)
+    invoice_date = start_ts + pd.to_timedelta(
+        np.sort(rng.integers(0, span_min, n_invoices)), unit="m"
+    )
+
+    is_cancel = rng.random(n_invoices) < cancelled
+    invoice_no = (invoice + 536365).astype(str).astype(object)
+    invoice_no[is_cancel[invoice]] = "C" + invoice_no[is_cancel[invoice]]
+
+    quantity = rng.integers(1, 25, rows)
+    quantity[is_cancel[invoice]] *= -1
+    price = np.round(rng.gamma(2.0, 2.0, rows) + 0.1, 2)
+    price[rng.random(rows) < zero_price] = 0.0
+
+    stock = rng.integers(0, len(STOCK), rows)
+    country = np.array(COUNTRIES, dtype=object)[
+        rng.integers(0, len(COUNTRIES), customers)
+    ]
+
+    return pd.DataFrame({
+        "InvoiceNo": invoice_no,
+        "StockCode": np.array([s for s, _ in STOCK], dtype=object)[stock],
+        "Description": np.array([d for _, d in STOCK], dtype=object)[stock],
+        "Quantity": quantity,
+        "InvoiceDate": invoice_date[invoice],
+        "UnitPrice": price,
+        "CustomerID": invoice_customer[invoice],
+        "Country": country[invoice_customer_idx][invoice],
+    })
+
+
+def write_transactions(df, path):
+    """Write as .csv or .xlsx (the formats the upload endpoint accepts)."""
+    if path.lower().endswith(".xlsx"):
+        df.to_excel(path, index=False, sheet_name="Online Retail")
+    else:
+        df.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Online Retail transactions")
+    parser.add_argument("--rows", type=int, default=100_000, help="Invoice lines")
+    parser.add_argument("--customers", type=int, default=None,
+                        help="Distinct customers (default rows / 100)")
+    parser.add_argument("--lines-per-invoice", type=int, default=20,
+                        help="Average invoice fan-out")
+    parser.add_argument("--start", default="2010-12-01", help="First invoice date")
+    parser.add_argument("--end", default="2011-12-09", help="End of the date range")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True, help="Output .csv or .xlsx path")
+    args = parser.parse_args()
+
+    df = generate_transactions(
+        args.rows, args.customers, args.lines_per_invoice,
+        args.start, args.end, seed=args.seed
+    )
+    write_transactions(df, args.out)
+    print(f"Wrote {len(df):,} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
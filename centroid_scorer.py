@@ -0,0 +1,201 @@
+"""
+Nearest-centroid scoring without scikit-learn.
+
+The KMeans artifact is only needed for its cluster_centers_; this module
+exports them (plus feature names and the source file hash) to a small
+.npz file and scores with NumPy in float32, in chunks.
+
+    python centroid_scorer.py export --model model/rfm_kmeans.model
+    python centroid_scorer.py parity --model model/rfm_kmeans.model --rows 1000000
+"""
+import os
+import time
+import hashlib
+import argparse
+import numpy as np
+
+ARTIFACT_FORMAT = 1
+CHUNK_ROWS = 65_536
+# float32 distance gaps below this (relative) are re-checked in float64
+TIE_TOLERANCE = 1e-4
+
+
+def centroids_path_for(model_path):
+    """model/rfm_kmeans.model -> model/rfm_kmeans.centroids.npz"""
+    return os.path.splitext(model_path)[0] + ".centroids.npz"
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class CentroidScorer:
+    """
+    predict()-compatible scorer: label of the nearest center.
+
+    Distances are ||c||^2 - 2 x.c (the same expansion sklearn uses),
+    computed in float32; rows whose two best distances are closer than
+    TIE_TOLERANCE are recomputed in float64 so labels match KMeans.predict.
+    """
+
+    def __init__(self, centers, feature_names=None, source_sha256=None):
+        self.centers = np.asarray(centers, dtype="float64")
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.source_sha256 = source_sha256
+        self.n_clusters, self.n_features = self.centers.shape
+
+        self._centers32 = self.centers.astype("float32")
+        self._sq32 = (self._centers32 ** 2).sum(axis=1)
+        self._sq64 = (self.centers ** 2).sum(axis=1)
+
+    def _matrix(self, X):
+        if hasattr(X, "columns"):
+            if self.feature_names is not None and list(X.columns) != self.feature_names:
+                X = X[self.feature_names]
+            X = X.to_numpy()
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but the model expects {self.n_features}"
+            )
+        return X
+
+    def _score_chunk(self, chunk):
+        x32 = chunk.astype("float32", copy=False)
+        # (k, n): one contiguous distance row per center
+        dist = self._sq32[:, None] - 2.0 * (self._centers32 @ x32.T)
+
+        # running best and second-best distance over the centers
+        labels = np.zeros(len(chunk), dtype="int32")
+        best = dist[0].copy()
+        second = np.full(len(chunk), np.inf, dtype="float32")
+        loser = np.empty_like(best)
+        for j in range(1, self.n_clusters):
+            d = dist[j]
+            np.maximum(best, d, out=loser)
+            np.minimum(second, loser, out=second)
+            np.putmask(labels, d < best, j)
+            np.minimum(best, d, out=best)
+
+        scale = np.maximum(np.maximum(np.abs(best), np.abs(second)), 1.0)
+        close = (second - best) <= TIE_TOLERANCE * scale
+        if close.any():
+            x64 = chunk[close].astype("float64")
+            dist64 = self._sq64 - 2.0 * (x64 @ self.centers.T)
+            labels[close] = dist64.argmin(axis=1)
+        return labels
+
+    def predict(self, X, chunk_rows=CHUNK_ROWS):
+        X = self._matrix(X)
+        labels = np.empty(len(X), dtype="int32")
+        for start in range(0, len(X), chunk_rows):
+            labels[start:start + chunk_rows] = self._score_chunk(X[start:start + chunk_rows])
+        return labels
+
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            format=np.array(ARTIFACT_FORMAT),
+            centers=self.centers,
+            feature_names=np.array(self.feature_names or [], dtype=str),
+            source_sha256=np.array(self.source_sha256 or "", dtype=str),
+        )
+        os.replace(tmp, path)
+
+
+def load_scorer(path):
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["format"]) != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported centroid artifact format in {path}")
+        names = [str(n) for n in data["feature_names"]] or None
+        sha = str(data["source_sha256"]) or None
+        return CentroidScorer(data["centers"], names, sha)
+
+
+def scorer_from_model(model, source_sha256=None):
+    names = getattr(model, "feature_names_in_", None)
+    return CentroidScorer(model.cluster_centers_, names, source_sha256)
+
+
+def check_parity(model, scorer, X):
+    """Number of rows where the scorer disagrees with model.predict."""
+    return int((np.asarray(model.predict(X)) != scorer.predict(X)).sum())
+
+
+def parity_sample(scorer, rows=200_000, seed=0):
+    """Standard-scaled-looking points plus points near every center."""
+    rng = np.random.default_rng(seed)
+    random = rng.normal(0, 1.5, size=(rows, scorer.n_features))
+    near = np.repeat(scorer.centers, 100, axis=0) + rng.normal(0, 1e-3, (scorer.n_clusters * 100, scorer.n_features))
+    return np.vstack([random, near])
+
+
+def export_centroids(model_path, out_path=None, check_rows=200_000):
+    """Write the centroid artifact for a joblib KMeans file (parity-checked)."""
+    import joblib
+
+    out_path = out_path or centroids_path_for(model_path)
+    model = joblib.load(model_path)
+    scorer = scorer_from_model(model, _sha256(model_path))
+
+    if check_rows:
+        X = parity_sample(scorer, check_rows)
+        if getattr(model, "feature_names_in_", None) is not None:
+            import pandas as pd
+            X = pd.DataFrame(X, columns=model.feature_names_in_)
+        mismatches = check_parity(model, scorer, X)
+        if mismatches:
+            raise ValueError(f"Centroid scorer disagrees with the model on {mismatches} rows")
+
+    scorer.save(out_path)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Centroid scoring artifact")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Write <model>.centroids.npz")
+    exp.add_argument("--model", default="model/rfm_kmeans.model")
+    exp.add_argument("--out", default=None)
+
+    par = sub.add_parser("parity", help="Compare labels and latency with KMeans.predict")
+    par.add_argument("--model", default="model/rfm_kmeans.model")
+    par.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print("Centroid artifact written to:", export_centroids(args.model, args.out))
+        return
+
+    import joblib
+    import pandas as pd
+
+    model = joblib.load(args.model)
+    scorer = scorer_from_model(model)
+    X = parity_sample(scorer, args.rows)
+    if getattr(model, "feature_names_in_", None) is not None:
+        X = pd.DataFrame(X, columns=model.feature_names_in_)
+
+    start = time.perf_counter()
+    expected = model.predict(X)
+    t_sklearn = time.perf_counter() - start
+    start = time.perf_counter()
+    labels = scorer.predict(X)
+    t_numpy = time.perf_counter() - start
+
+    print({
+        "rows": len(X),
+        "mismatches": int((expected != labels).sum()),
+        "sklearn_s": round(t_sklearn, 4),
+        "centroid_s": round(t_numpy, 4),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import mysql.connector
+from db_pool import ConnectionPool
 
 load_dotenv()
 
@@ -12,12 +14,79 @@ UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 MODEL_PATH = os.getenv("MODEL_PATH", "model/rfm_kmeans.model")
 SECRET_KEY = os.getenv("SECRET_KEY", "replace_with_secret")
 
-def get_db_connection():
+# Model registry: extra models as "name@version=path,name@version=path"
+MODEL_REGISTRY = os.getenv("MODEL_REGISTRY", "")
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+# "centroid" scores with <model>.centroids.npz when it matches the model file
+MODEL_SCORER = os.getenv("MODEL_SCORER", "centroid")
+
+# rfm_results bulk writer: "insert" (multi-row INSERT) or "load_data"
+RFM_INSERT_METHOD = os.getenv("RFM_INSERT_METHOD", "insert")
+RFM_INSERT_BATCH_SIZE = int(os.getenv("RFM_INSERT_BATCH_SIZE", "1000"))
+RFM_INSERT_COMMIT_EVERY = int(os.getenv("RFM_INSERT_COMMIT_EVERY", "0"))
+
+# DB connection pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# Async RFM jobs (process pool)
+RFM_JOB_WORKERS = int(os.getenv("RFM_JOB_WORKERS", "2"))
+RFM_JOB_MAX_PENDING = int(os.getenv("RFM_JOB_MAX_PENDING", "20"))
+RFM_JOB_HISTORY = int(os.getenv("RFM_JOB_HISTORY", "200"))
+RFM_ASYNC_DEFAULT = os.getenv("RFM_ASYNC_DEFAULT", "0") == "1"
+
+# Streaming RFM for large CSV uploads (0 MB = always stream)
+RFM_STREAM_CHUNKSIZE = int(os.getenv("RFM_STREAM_CHUNKSIZE", "100000"))
+RFM_STREAM_MIN_MB = float(os.getenv("RFM_STREAM_MIN_MB", "100"))
+
+# Map-reduce RFM over cached uploads (workers <= 1 = off)
+RFM_PARALLEL_WORKERS = int(os.getenv("RFM_PARALLEL_WORKERS", "0"))
+RFM_PARALLEL_MIN_ROWS = int(os.getenv("RFM_PARALLEL_MIN_ROWS", "5000000"))
+
+# One JSON log line per RFM request/job with its stage spans
+RFM_TRACE_LOG = os.getenv("RFM_TRACE_LOG", "1") == "1"
+
+# Password hashing (bcrypt cost + bounded worker pool for auth routes)
+AUTH_BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", "32"))
+AUTH_HASH_TIMEOUT = float(os.getenv("AUTH_HASH_TIMEOUT", "10"))
+
+def _connect():
     conn = mysql.connector.connect(
         host=DB_HOST,
         user=DB_USER,
         password=DB_PASS,
         database=DB_NAME,
-        auth_plugin='mysql_native_password'
+        auth_plugin='mysql_native_password',
+        allow_local_infile=(RFM_INSERT_METHOD == "load_data")
     )
     return conn
+
+
+db_pool = ConnectionPool(
+    _connect,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    timeout=DB_POOL_TIMEOUT,
+    recycle=DB_POOL_RECYCLE,
+    pre_ping=DB_POOL_PRE_PING
+)
+
+
+def get_db_connection():
+    """Check a connection out of the pool; conn.close() returns it."""
+    return db_pool.connect()
+
+
+@contextmanager
+def db_connection():
+    """Pooled connection that is always returned, even on early return."""
+    conn = db_pool.connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,217 @@
+import time
+import weakref
+import threading
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the pool timeout."""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a driver connection. Everything is delegated to the
+    real connection except close(), which hands it back to the pool.
+
+    A proxy dropped without close() (e.g. an exception before it) is
+    reclaimed on garbage collection: the driver connection, whose state is
+    unknown, is closed and its pool slot freed.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._closed = False
+        self._finalizer = weakref.finalize(self, pool._discard, raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._finalizer.detach()
+        self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool.
+
+    Keeps up to `pool_size` idle connections and allows `max_overflow`
+    extra ones under load (those are closed instead of kept when returned).
+    Idle connections are pinged before being handed out (`pre_ping`) and
+    replaced once they are older than `recycle` seconds.
+    """
+
+    def __init__(self, factory, pool_size=5, max_overflow=10, timeout=30,
+                 recycle=3600, pre_ping=True):
+        self._factory = factory
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._idle = deque()     # (raw, created_at)
+        self._open = 0           # connections currently open (idle + in use)
+        self._waiting = 0
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "timeouts": 0,
+            "reclaimed": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    # ----------------------------
+    # checkout / release
+    # ----------------------------
+    def connect(self):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    raw, created_at = None, None
+                    self._open += 1
+                    break
+
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"no database connection available after {self.timeout}s"
+                    )
+                waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._stats["checkouts"] += 1
+            if waited:
+                wait = time.perf_counter() - start
+                self._stats["waits"] += 1
+                self._stats["wait_seconds_total"] += wait
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+
+        # connecting / pinging happens outside the lock
+        try:
+            if raw is not None:
+                raw, created_at = self._validate(raw, created_at)
+            if raw is None:
+                raw, created_at = self._factory(), time.monotonic()
+                with self._cond:
+                    self._stats["created"] += 1
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _validate(self, raw, created_at):
+        """Return (raw, created_at), or (None, None) if it must be replaced."""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._close_quietly(raw)
+            with self._cond:
+                self._stats["recycled"] += 1
+            return None, None
+
+        if self.pre_ping:
+            try:
+                if hasattr(raw, "ping"):
+                    raw.ping(reconnect=False)
+                else:
+                    raw.execute("SELECT 1")
+            except Exception:
+                self._close_quietly(raw)
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+                return None, None
+
+        return raw, created_at
+
+    def _release(self, raw, created_at):
+        keep = True
+        try:
+            # never hand out a connection with an open transaction
+            if getattr(raw, "in_transaction", True):
+                raw.rollback()
+        except Exception:
+            keep = False
+
+        with self._cond:
+            if keep and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+            else:
+                self._open -= 1
+                keep = False
+            self._cond.notify()
+
+        if not keep:
+            self._close_quietly(raw)
+
+    def _discard(self, raw):
+        """Free the slot of a connection whose proxy was never closed."""
+        with self._cond:
+            self._open -= 1
+            self._stats["reclaimed"] += 1
+            self._cond.notify()
+        self._close_quietly(raw)
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    # ----------------------------
+    # introspection
+    # ----------------------------
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            checkouts = self._stats["checkouts"]
+            return {
+                **self._stats,
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": idle,
+                "in_use": self._open - idle,
+                "waiting": self._waiting,
+                "wait_seconds_avg": (
+                    self._stats["wait_seconds_total"] / checkouts if checkouts else 0.0
+                ),
+            }
+
+    def dispose(self):
+        """Close all idle connections (e.g. after fork)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._close_quietly(raw)
@@ -0,0 +1,190 @@
+import sys
+import json
+import time
+import uuid
+import logging
+import resource
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+logger = logging.getLogger("rfm.trace")
+logger.addHandler(logging.NullHandler())
+
+
+def _max_rss_bytes():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ============================
+# AGGREGATES (/metrics)
+# ============================
+class StageMetrics:
+    """Per-stage duration histogram, row counters and peak RSS growth."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, span):
+        with self._lock:
+            m = self._stages.setdefault(span["stage"], {
+                "count": 0,
+                "sum": 0.0,
+                "buckets": [0] * len(self.buckets),
+                "errors": 0,
+                "rows_in": 0,
+                "rows_out": 0,
+                "rss_delta_total": 0,
+                "rss_delta_max": 0,
+            })
+            m["count"] += 1
+            m["sum"] += span["seconds"]
+            for i, le in enumerate(self.buckets):
+                if span["seconds"] <= le:
+                    m["buckets"][i] += 1
+            if span["status"] != "ok":
+                m["errors"] += 1
+            m["rows_in"] += span["rows_in"] or 0
+            m["rows_out"] += span["rows_out"] or 0
+            m["rss_delta_total"] += span["rss_delta_bytes"]
+            m["rss_delta_max"] = max(m["rss_delta_max"], span["rss_delta_bytes"])
+
+    def render(self):
+        """Prometheus text exposition of the stage metrics."""
+        with self._lock:
+            stages = {k: {**v, "buckets": list(v["buckets"])} for k, v in self._stages.items()}
+
+        lines = [
+            "# HELP rfm_stage_duration_seconds Wall time per RFM stage.",
+            "# TYPE rfm_stage_duration_seconds histogram",
+        ]
+        for stage, m in sorted(stages.items()):
+            for le, n in zip(self.buckets, m["buckets"]):
+                lines.append(f'rfm_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {n}')
+            lines.append(f'rfm_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {m["count"]}')
+            lines.append(f'rfm_stage_duration_seconds_sum{{stage="{stage}"}} {m["sum"]}')
+            lines.append(f'rfm_stage_duration_seconds_count{{stage="{stage}"}} {m["count"]}')
+
+        for name, key, kind, help_text in [
+            ("rfm_stage_errors_total", "errors", "counter", "Stages that raised."),
+            ("rfm_stage_rows_in_total", "rows_in", "counter", "Rows entering each stage."),
+            ("rfm_stage_rows_out_total", "rows_out", "counter", "Rows leaving each stage."),
+            ("rfm_stage_rss_peak_increase_bytes_total", "rss_delta_total", "counter",
+             "Growth of the process peak RSS during each stage."),
+            ("rfm_stage_rss_peak_increase_bytes_max", "rss_delta_max", "gauge",
+             "Largest single peak RSS growth of each stage."),
+        ]:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, m in sorted(stages.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {m[key]}')
+
+        lines.append("# HELP process_max_rss_bytes Peak resident set size of this process.")
+        lines.append("# TYPE process_max_rss_bytes gauge")
+        lines.append(f"process_max_rss_bytes {_max_rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+
+
+def render_gauges(prefix, stats):
+    """Numeric entries of a stats() dict as Prometheus gauges."""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"# TYPE {prefix}_{key} gauge")
+        lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================
+# TRACES & SPANS
+# ============================
+_current = contextvars.ContextVar("rfm_trace", default=None)
+
+
+class Trace:
+    """Spans of one request or job; logged as a single JSON line at the end."""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.fields = fields
+        self.spans = []
+        self.status = "ok"
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage, rows_in=None):
+        """
+        Time a stage. Set `rows_out` (and `rows_in` if only known later)
+        on the yielded dict.
+        """
+        record = {"stage": stage, "rows_in": rows_in, "rows_out": None, "status": "ok"}
+        rss_before = _max_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record["status"] = "error"
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            record["rss_delta_bytes"] = _max_rss_bytes() - rss_before
+            self.spans.append(record)
+            stage_metrics.observe(record)
+
+    def log(self, **extra):
+        logger.info(json.dumps({
+            "event": self.name,
+            "trace_id": self.trace_id,
+            "status": self.status,
+            "seconds": round(time.perf_counter() - self.started, 6),
+            **self.fields,
+            **extra,
+            "spans": self.spans,
+        }, default=str))
+
+
+@contextmanager
+def trace(name, **fields):
+    """
+    Make a Trace current for span() calls in this context; log it on exit.
+    Set `status` on the trace for handled failures.
+    """
+    t = Trace(name, **fields)
+    token = _current.set(t)
+    try:
+        yield t
+    except BaseException as e:
+        t.status = "error"
+        t.log(error=str(e))
+        raise
+    else:
+        t.log()
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage, rows_in=None):
+    """Span on the current trace (metrics only when there is none)."""
+    t = _current.get() or Trace(stage)
+    with t.span(stage, rows_in) as record:
+        yield record
+
+
+def enable_trace_log(stream=None):
+    """Write the per-request JSON lines to stderr (or `stream`)."""
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
@@ -0,0 +1,232 @@
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import RFM_JOB_WORKERS, RFM_JOB_MAX_PENDING, RFM_JOB_HISTORY, RFM_TRACE_LOG
+from rfm_service import (
+    STAGES, RfmProcessingError, process_file, count_reuse, reuse_stats_snapshot
+)
+from instrumentation import trace, stage_metrics, enable_trace_log
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue already holds max_pending jobs."""
+
+
+class JobSubmitError(Exception):
+    """Raised when a job could not be handed to the worker pool."""
+
+
+# ============================
+# WORKER PROCESS SIDE
+# ============================
+_progress_queue = None
+
+
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+    if RFM_TRACE_LOG:
+        enable_trace_log()
+
+
+def _run_job(job_id, file_id, filepath, content_hash=None):
+    def progress(stage):
+        _progress_queue.put((job_id, stage, time.time()))
+
+    # spans and reuse counts go back with the outcome; the web process serves them
+    reuse_before = reuse_stats_snapshot()
+    with trace("rfm_job", job_id=job_id, file_id=file_id) as t:
+        try:
+            outcome = {"ok": True, "result": process_file(file_id, filepath, progress, content_hash)}
+        except RfmProcessingError as e:
+            t.status = "error"
+            outcome = {"ok": False, "error": e.message, "status": e.status}
+    reuse = {k: v - reuse_before[k] for k, v in reuse_stats_snapshot().items()}
+    return {**outcome, "spans": t.spans, "reuse": reuse}
+
+
+# ============================
+# WEB PROCESS SIDE
+# ============================
+class JobManager:
+    """
+    Runs RFM processing jobs in a process pool so web threads return
+    immediately. At most `max_workers` jobs run at once and at most
+    `max_pending` may be queued or running; job records live in this
+    process (keep the last `history` finished ones).
+
+    A worker that dies (e.g. OOM-killed) breaks the whole process pool;
+    the jobs it held are marked failed and the pool is rebuilt on the next
+    submit.
+    """
+
+    def __init__(self, max_workers=RFM_JOB_WORKERS, max_pending=RFM_JOB_MAX_PENDING,
+                 history=RFM_JOB_HISTORY):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._executor = None
+        self._executor_jobs = set()   # job ids handed to the current executor
+        self._queue = None
+
+    def _ensure_started(self):
+        if self._executor is not None:
+            return
+        # spawn, so children never share the parent's pooled DB sockets
+        ctx = multiprocessing.get_context("spawn")
+        if self._queue is None:
+            self._queue = ctx.Queue()
+            threading.Thread(target=self._drain_progress, daemon=True).start()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self._queue,)
+        )
+        self._executor_jobs = set()
+
+    def _discard_executor(self, reason):
+        """Drop a broken executor and fail the jobs it still held (lock held)."""
+        if self._executor is None:
+            return
+        # its pending futures already fail with BrokenProcessPool
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        now = time.time()
+        for job_id in self._executor_jobs:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] in ("queued", "running"):
+                job["status"] = "failed"
+                job["error"] = reason
+                job["finished_at"] = now
+        self._executor_jobs = set()
+
+    def _drain_progress(self):
+        while True:
+            job_id, stage, ts = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] in ("done", "failed"):
+                    continue
+                if job["status"] == "queued":
+                    job["status"] = "running"
+                    job["started_at"] = ts
+                if job["stage"] is not None:
+                    job["stages"][job["stage"]]["finished_at"] = ts
+                job["stage"] = stage
+                job["stages"][stage] = {"started_at": ts, "finished_at": None}
+                job["progress"] = round(STAGES.index(stage) / len(STAGES) * 100, 1)
+
+    def _active(self):
+        return sum(1 for j in self._jobs.values() if j["status"] in ("queued", "running"))
+
+    def _prune(self):
+        finished = [k for k, j in self._jobs.items() if j["status"] in ("done", "failed")]
+        for k in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[k]
+
+    def submit(self, user_id, file_id, filepath, content_hash=None):
+        with self._lock:
+            if self._active() >= self.max_pending:
+                raise JobQueueFull(f"too many pending jobs (limit {self.max_pending})")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "user_id": user_id,
+                "file_id": file_id,
+                "status": "queued",
+                "stage": None,
+                "stages": {},
+                "progress": 0.0,
+                "error": None,
+                "result": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self._prune()
+
+            # a broken pool is rebuilt once; any other failure drops the record
+            for attempt in (1, 2):
+                try:
+                    self._ensure_started()
+                    future = self._executor.submit(
+                        _run_job, job_id, file_id, filepath, content_hash
+                    )
+                    break
+                except BrokenProcessPool:
+                    self._discard_executor("Job crashed: worker process died")
+                    if attempt == 2:
+                        del self._jobs[job_id]
+                        raise JobSubmitError("job worker pool is unavailable")
+                except Exception as e:
+                    del self._jobs[job_id]
+                    raise JobSubmitError(f"could not start job: {str(e)}")
+            self._executor_jobs.add(job_id)
+
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return job_id
+
+    def _finish(self, job_id, future):
+        now = time.time()
+        try:
+            outcome = future.result()
+        except BrokenProcessPool:
+            outcome = {"ok": False, "error": "Job crashed: worker process died", "status": 500}
+        except Exception as e:
+            outcome = {"ok": False, "error": f"Job crashed: {str(e)}", "status": 500}
+
+        for s in outcome.get("spans", []):
+            stage_metrics.observe(s)
+        count_reuse(**outcome.get("reuse", {}))
+
+        with self._lock:
+            self._executor_jobs.discard(job_id)
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                return
+            if job["stage"] is not None:
+                job["stages"][job["stage"]]["finished_at"] = now
+            job["finished_at"] = now
+            if outcome["ok"]:
+                job["status"] = "done"
+                job["progress"] = 100.0
+                job["result"] = outcome["result"]
+            else:
+                job["status"] = "failed"
+                job["error"] = outcome["error"]
+
+    def get(self, job_id, user_id=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (user_id is not None and job["user_id"] != user_id):
+                return None
+            return _public(job)
+
+    def list(self, user_id):
+        with self._lock:
+            return [_public(j) for j in self._jobs.values() if j["user_id"] == user_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for j in self._jobs.values():
+                counts[j["status"]] = counts.get(j["status"], 0) + 1
+            return {"max_workers": self.max_workers, "max_pending": self.max_pending, **counts}
+
+
+def _public(job):
+    out = {k: v for k, v in job.items() if k != "user_id"}
+    out["stages"] = {k: dict(v) for k, v in job["stages"].items()}
+    return out
+
+
+job_manager = JobManager()
@@ -67,6 +67,89 @@ def run_migration():
         );
     """)
 
+    # RFM runs (content hash + model version → reusable results)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rfm_runs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            file_id INT NOT NULL,
+            content_hash CHAR(64),
+            model_version VARCHAR(100) NOT NULL,
+            total_customers INT,
+            clusters INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (file_id) REFERENCES upload_history(id) ON DELETE CASCADE
+        );
+    """)
+
+    # Per-file cluster profile (same aggregate as cluster_profile_labeled.csv)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rfm_cluster_summary (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            file_id INT NOT NULL,
+            cluster INT NOT NULL,
+            recency_mean DOUBLE,
+            frequency_mean DOUBLE,
+            monetary_mean DOUBLE,
+            customer_count INT,
+            percentage DOUBLE,
+            segment VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_summary_file_cluster (file_id, cluster),
+            FOREIGN KEY (file_id) REFERENCES upload_history(id) ON DELETE CASCADE
+        );
+    """)
+
+    # Incremental RFM: per-customer state and the transform it was scored with
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS customer_state (
+            user_id INT NOT NULL,
+            customer_id VARCHAR(100) NOT NULL,
+            last_purchase DATETIME NOT NULL,
+            frequency INT NOT NULL,
+            monetary DOUBLE NOT NULL,
+            recency INT,
+            cluster INT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, customer_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS customer_state_params (
+            user_id INT PRIMARY KEY,
+            q99_f DOUBLE NOT NULL,
+            q99_m DOUBLE NOT NULL,
+            scaler_mean VARCHAR(255) NOT NULL,
+            scaler_scale VARCHAR(255) NOT NULL,
+            max_purchase DATETIME NOT NULL,
+            model_version VARCHAR(100) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    """)
+
+    # Deltas folded into customer_state (each upload is applied once)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS customer_state_deltas (
+            user_id INT NOT NULL,
+            file_id INT NOT NULL,
+            content_hash CHAR(64) NULL,
+            customers INT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, file_id),
+            KEY idx_delta_user_hash (user_id, content_hash),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    """)
+
+    # Column added after the first release (safe creation)
+    try:
+        cur.execute("ALTER TABLE upload_history ADD COLUMN content_hash CHAR(64) NULL;")
+        print("Column upload_history.content_hash added.")
+    except:
+        print("Column upload_history.content_hash already exists. Skipping.")
+
     # Index (safe creation)
     try:
         cur.execute("CREATE INDEX idx_rfm_file ON rfm_results(file_id);")
@@ -74,6 +157,19 @@ def run_migration():
     except:
         print("Index idx_rfm_file already exists. Skipping.")
 
+    # keyset pages / cluster filter on (file_id, cluster, id)
+    try:
+        cur.execute("CREATE INDEX idx_rfm_file_cluster ON rfm_results(file_id, cluster);")
+        print("Index idx_rfm_file_cluster created.")
+    except:
+        print("Index idx_rfm_file_cluster already exists. Skipping.")
+
+    try:
+        cur.execute("CREATE INDEX idx_runs_hash ON rfm_runs(content_hash, model_version);")
+        print("Index idx_runs_hash created.")
+    except:
+        print("Index idx_runs_hash already exists. Skipping.")
+
     conn.commit()
     cur.close()
     conn.close()
@@ -0,0 +1,223 @@
+import os
+import time
+import hashlib
+import threading
+
+from config import MODEL_PATH, MODEL_REGISTRY, MODEL_RELOAD_INTERVAL, MODEL_SCORER
+from centroid_scorer import CentroidScorer, centroids_path_for, load_scorer
+
+DEFAULT_MODEL = "rfm_kmeans"
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the hex sha256 of a file, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_centroids(path, sha256):
+    """Centroid scorer exported from this exact model file, if there is one."""
+    artifact = centroids_path_for(path)
+    if not os.path.exists(artifact):
+        return None
+    try:
+        scorer = load_scorer(artifact)
+    except Exception:
+        return None
+    return scorer if scorer.source_sha256 == sha256 else None
+
+
+class ModelEntry:
+    """A loaded model plus the file signature it was loaded from."""
+
+    def __init__(self, name, version, path, model, mtime, size, sha256, load_seconds):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.model = model
+        self.mtime = mtime
+        self.size = size
+        self.sha256 = sha256
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.checked_at = time.monotonic()
+
+    @property
+    def model_version(self):
+        return f"{self.name}@{self.version}:{self.sha256[:12]}"
+
+    def info(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "path": self.path,
+            "sha256": self.sha256,
+            "model_version": self.model_version,
+            "scorer": "centroid" if isinstance(self.model, CentroidScorer) else "sklearn",
+            "load_seconds": round(self.load_seconds, 4),
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of trained models.
+
+    Each model is loaded once per worker and served from memory. The file
+    is re-checked at most every `check_interval` seconds by a background
+    thread; when its mtime or size changes the content hash is compared
+    and, if it differs, the new model is loaded and swapped in atomically.
+    Requests keep getting the current model while that happens, and a
+    failed reload keeps serving it.
+    """
+
+    def __init__(self, check_interval=MODEL_RELOAD_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._paths = {}       # (name, version) -> path
+        self._latest = {}      # name -> latest registered version
+        self._entries = {}     # (name, version) -> ModelEntry
+        self._load_locks = {}  # (name, version) -> Lock held during a first load
+        self._reloading = set()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "reloads": 0,
+            "reload_errors": 0,
+            "load_seconds_total": 0.0,
+        }
+
+    # ----------------------------
+    # registration
+    # ----------------------------
+    def register(self, name, path, version="1"):
+        with self._lock:
+            self._paths[(name, str(version))] = path
+            self._latest[name] = str(version)
+
+    def register_from_config(self):
+        self.register(DEFAULT_MODEL, MODEL_PATH)
+        for item in MODEL_REGISTRY.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            key, path = item.split("=", 1)
+            name, _, version = key.partition("@")
+            self.register(name.strip(), path.strip(), version.strip() or "1")
+
+    # ----------------------------
+    # loading (never under self._lock)
+    # ----------------------------
+    def _load(self, name, version, path):
+        st = os.stat(path)
+        sha = file_sha256(path)
+        start = time.perf_counter()
+        model = _load_centroids(path, sha) if MODEL_SCORER == "centroid" else None
+        if model is None:
+            import joblib
+
+            model = joblib.load(path)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["load_seconds_total"] += elapsed
+        return ModelEntry(name, version, path, model, st.st_mtime, st.st_size, sha, elapsed)
+
+    def _resolve(self, name, version):
+        if version is None:
+            version = self._latest.get(name)
+        key = (name, str(version))
+        if key not in self._paths:
+            raise KeyError(f"model {name}@{version} is not registered")
+        return key
+
+    def _first_load(self, key):
+        """Load a model not cached yet; concurrent callers wait for one load."""
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._stats["hits"] += 1
+                    return entry
+                self._stats["misses"] += 1
+                path = self._paths[key]
+            entry = self._load(key[0], key[1], path)
+            with self._lock:
+                self._entries[key] = entry
+            return entry
+
+    def _schedule_check(self, key, entry):
+        """Start a background file check if one is due (caller holds self._lock)."""
+        now = time.monotonic()
+        if now - entry.checked_at < self.check_interval or key in self._reloading:
+            return
+        entry.checked_at = now
+        self._reloading.add(key)
+        threading.Thread(
+            target=self._refresh, args=(key, entry), name=f"model-reload-{key[0]}", daemon=True
+        ).start()
+
+    def _refresh(self, key, entry):
+        try:
+            st = os.stat(entry.path)
+            if (st.st_mtime, st.st_size) == (entry.mtime, entry.size):
+                return
+            if file_sha256(entry.path) == entry.sha256:
+                entry.mtime, entry.size = st.st_mtime, st.st_size
+                return
+            new_entry = self._load(entry.name, entry.version, entry.path)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._entries[key] = new_entry
+                    self._stats["reloads"] += 1
+        except Exception:
+            with self._lock:
+                self._stats["reload_errors"] += 1
+        finally:
+            with self._lock:
+                self._reloading.discard(key)
+
+    def get_entry(self, name=DEFAULT_MODEL, version=None):
+        with self._lock:
+            key = self._resolve(name, version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._stats["hits"] += 1
+                self._schedule_check(key, entry)
+                return entry
+        return self._first_load(key)
+
+    def get(self, name=DEFAULT_MODEL, version=None):
+        """Return the cached model object, loading it on first use."""
+        return self.get_entry(name, version).model
+
+    def warm(self):
+        """Load every registered model; errors are reported, not raised."""
+        errors = {}
+        with self._lock:
+            keys = list(self._paths)
+        for key in keys:
+            try:
+                self._first_load(key)
+            except Exception as e:
+                errors[f"{key[0]}@{key[1]}"] = str(e)
+        return errors
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "models": [e.info() for e in self._entries.values()],
+            }
+
+
+registry = ModelRegistry()
+registry.register_from_config()
+
+
+def get_model(name=DEFAULT_MODEL, version=None):
+    return registry.get(name, version)
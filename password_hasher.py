@@ -0,0 +1,108 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+from config import AUTH_BCRYPT_ROUNDS, AUTH_HASH_WORKERS, AUTH_HASH_MAX_PENDING, AUTH_HASH_TIMEOUT
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash waited too long."""
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing/verification on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so `max_workers` bounds how many cores auth
+    requests can take from scoring. At most `max_pending` operations may be
+    queued or running; beyond that callers get HasherBusy immediately
+    instead of piling up. `timeout` caps queue wait + hash time per call.
+    """
+
+    def __init__(self, rounds=AUTH_BCRYPT_ROUNDS, max_workers=AUTH_HASH_WORKERS,
+                 max_pending=AUTH_HASH_MAX_PENDING, timeout=AUTH_HASH_TIMEOUT):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+        self._stats = {
+            "hashes": 0,
+            "checks": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "hash_seconds_total": 0.0,
+            "hash_seconds_max": 0.0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+        }
+
+    def _run(self, kind, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise HasherBusy(f"password hashing busy (limit {self.max_pending})")
+            self._pending += 1
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                self._record(kind, started - submitted, finished - started)
+
+        future = self._executor.submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise HasherBusy("password hashing timed out")
+
+    def _record(self, kind, waited, took):
+        with self._lock:
+            self._pending -= 1
+            s = self._stats
+            s[kind] += 1
+            s["hash_seconds_total"] += took
+            s["hash_seconds_max"] = max(s["hash_seconds_max"], took)
+            s["queue_wait_seconds_total"] += waited
+            s["queue_wait_seconds_max"] = max(s["queue_wait_seconds_max"], waited)
+
+    def hash(self, password):
+        """bcrypt hash of a str password, with the configured cost."""
+        return self._run(
+            "hashes", lambda pw: bcrypt.hashpw(pw, bcrypt.gensalt(self.rounds)),
+            password.encode()
+        )
+
+    def check(self, password, stored_hash):
+        return self._run("checks", bcrypt.checkpw, password.encode(), bytes(stored_hash))
+
+    def stats(self):
+        with self._lock:
+            done = self._stats["hashes"] + self._stats["checks"]
+            return {
+                **self._stats,
+                "rounds": self.rounds,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "hash_seconds_avg": self._stats["hash_seconds_total"] / done if done else 0.0,
+                "queue_wait_seconds_avg": (
+                    self._stats["queue_wait_seconds_total"] / done if done else 0.0
+                ),
+            }
+
+
+password_hasher = PasswordHasher()
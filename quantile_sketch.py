@@ -0,0 +1,133 @@
+"""
+Mergeable KLL quantile sketch (Karnin, Lang, Liberty 2016).
+
+Items live in levels; an item at level h stands for 2**h input values.
+When a level outgrows its capacity it is sorted and every other item
+(random offset) is promoted to the next level. Capacities shrink by 2/3
+per level below the top, so a sketch keeps O(k) items for any n and
+answers quantiles within a normalized rank error that depends only on k.
+
+Sketches of different chunks or partitions merge by concatenating their
+levels and compacting, with the same error guarantee as one sketch over
+all values.
+"""
+import math
+import numpy as np
+
+DEFAULT_K = 200
+MIN_CAPACITY = 8
+CAPACITY_DECAY = 2 / 3
+
+
+def rank_error_for_k(k):
+    """Normalized rank error (~99% confidence) of a sketch with parameter k."""
+    # empirical fit published with the Apache DataSketches KLL sketch
+    return 2.296 / k ** 0.9723
+
+
+def k_for_rank_error(eps):
+    """Smallest k whose rank_error_for_k is at most `eps`."""
+    if not 0 < eps < 1:
+        raise ValueError("rank error must be in (0, 1)")
+    return max(MIN_CAPACITY, math.ceil((2.296 / eps) ** (1 / 0.9723)))
+
+
+class KLLSketch:
+    """
+    Quantile sketch over float values: update() with arrays, merge() with
+    other sketches, quantile()/rank() queries. `seed` makes the random
+    compaction offsets, and so the answers, reproducible.
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = int(k)
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def for_rank_error(cls, eps, seed=0):
+        return cls(k_for_rank_error(eps), seed)
+
+    @property
+    def rank_error(self):
+        return rank_error_for_k(self.k)
+
+    def __len__(self):
+        """Items retained (not values seen, see `n`)."""
+        return sum(len(level) for level in self._levels)
+
+    def _capacity(self, h):
+        depth = len(self._levels) - 1 - h
+        return max(MIN_CAPACITY, int(math.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self._levels):
+            level = self._levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                level = np.sort(level)
+                # an odd item out stays here; the rest halves into level h + 1
+                held = level[len(level) - len(level) % 2:]
+                pairs = level[:len(level) - len(held)]
+                promoted = pairs[int(self._rng.integers(2))::2]
+                self._levels[h] = held
+                self._levels[h + 1] = np.concatenate([self._levels[h + 1], promoted])
+            h += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64").ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another sketch into this one (the smaller k bounds the error)."""
+        self.k = min(self.k, other.k)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for h, level in enumerate(other._levels):
+            self._levels[h] = np.concatenate([self._levels[h], level])
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([
+            np.full(len(level), 2 ** h, dtype="int64") for h, level in enumerate(self._levels)
+        ])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Retained item at normalized rank `q` (nearest rank, like 'lower')."""
+        if self.n == 0:
+            return math.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        items, cum = self._weighted()
+        idx = int(np.searchsorted(cum, q * cum[-1], side="left"))
+        return float(items[min(idx, len(items) - 1)])
+
+    def rank(self, value):
+        """Estimated fraction of values <= `value`."""
+        if self.n == 0:
+            return math.nan
+        items, cum = self._weighted()
+        idx = int(np.searchsorted(items, value, side="right"))
+        return float(cum[idx - 1] / cum[-1]) if idx else 0.0
@@ -0,0 +1,274 @@
+import io
+import csv
+import json
+from operator import itemgetter
+
+RESULT_FIELDS = ["customer_id", "recency", "frequency", "monetary", "cluster"]
+SORT_FIELDS = ["id", "recency", "frequency", "monetary"]
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+# ?format= value -> media type; without ?format= the Accept header picks
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+MIME_ALIASES = {"application/x-parquet": "parquet"}
+BINARY_FORMATS = ("arrow", "parquet")
+# rows per Arrow record batch / Parquet row group
+EXPORT_BATCH_ROWS = 65_536
+
+
+class QueryError(ValueError):
+    """Invalid query-string option for the results endpoints."""
+
+
+# ============================
+# OPTIONS
+# ============================
+def parse_options(args):
+    """Validate the results query-string options (a request.args-like dict)."""
+    fields = args.get("fields")
+    if fields:
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in fields if f not in RESULT_FIELDS]
+        if unknown:
+            raise QueryError(f"unknown fields: {', '.join(unknown)}")
+    else:
+        fields = list(RESULT_FIELDS)
+
+    sort = args.get("sort", "id")
+    if sort not in SORT_FIELDS:
+        raise QueryError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+
+    order = args.get("order", "asc").lower()
+    if order not in ("asc", "desc"):
+        raise QueryError("order must be asc or desc")
+
+    cluster = args.get("cluster")
+    if cluster is not None:
+        try:
+            cluster = int(cluster)
+        except ValueError:
+            raise QueryError("cluster must be an integer")
+
+    limit = args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise QueryError("limit must be an integer")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise QueryError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    return {
+        "fields": fields,
+        "sort": sort,
+        "order": order,
+        "cluster": cluster,
+        "limit": limit,
+        "after": decode_cursor(args.get("after"), sort),
+    }
+
+
+def negotiate_format(args, accept):
+    """
+    Response format: ?format= when given, else the best match of the
+    Accept header (a werkzeug MIMEAccept); JSON for */* or no match.
+    """
+    fmt = args.get("format")
+    if fmt:
+        if fmt not in FORMATS:
+            raise QueryError(f"format must be one of: {', '.join(FORMATS)}")
+        return fmt
+
+    by_mime = {mime: name for name, mime in FORMATS.items()}
+    by_mime.update(MIME_ALIASES)
+    best = accept.best_match(list(by_mime), default=FORMATS["json"])
+    return by_mime[best]
+
+
+# ============================
+# KEYSET CURSOR
+# ============================
+def encode_cursor(row, sort):
+    """Cursor for the row after which the next page starts."""
+    if sort == "id":
+        return str(row["id"])
+    return f"{row[sort]}:{row['id']}"
+
+
+def decode_cursor(cursor, sort):
+    if not cursor:
+        return None
+    try:
+        if sort == "id":
+            return (int(cursor),)
+        value, row_id = cursor.rsplit(":", 1)
+        value = float(value) if sort == "monetary" else int(value)
+        return (value, int(row_id))
+    except ValueError:
+        raise QueryError("invalid cursor")
+
+
+# ============================
+# SQL
+# ============================
+def build_query(file_id, opts, limit=None):
+    """
+    SELECT for one page (or the whole stream when limit is None), using
+    keyset pagination on (file_id, [sort column,] id).
+    """
+    where = ["file_id=%s"]
+    params = [file_id]
+
+    if opts["cluster"] is not None:
+        where.append("cluster=%s")
+        params.append(opts["cluster"])
+
+    op = ">" if opts["order"] == "asc" else "<"
+    after = opts["after"]
+    if after is not None:
+        if opts["sort"] == "id":
+            where.append(f"id {op} %s")
+            params.append(after[0])
+        else:
+            col = opts["sort"]
+            where.append(f"({col} {op} %s OR ({col} = %s AND id {op} %s))")
+            params.extend([after[0], after[0], after[1]])
+
+    direction = opts["order"].upper()
+    order_by = "id" if opts["sort"] == "id" else f"{opts['sort']} {direction}, id"
+
+    columns = ["id"] + opts["fields"]
+    if opts["sort"] != "id" and opts["sort"] not in opts["fields"]:
+        columns.append(opts["sort"])
+
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM rfm_results
+        WHERE {' AND '.join(where)}
+        ORDER BY {order_by} {direction}
+    """
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def project(row, fields):
+    return {f: row[f] for f in fields}
+
+
+# ============================
+# STREAM FORMATS
+# ============================
+def iter_batches(cur, batch_size=1000):
+    """Row batches from a server-side (unbuffered) cursor."""
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def ndjson_chunks(batches, fields):
+    """One NDJSON text chunk per batch of rows."""
+    for rows in batches:
+        yield "".join(json.dumps(project(r, fields), default=str) + "\n" for r in rows)
+
+
+def csv_chunks(batches, fields):
+    """Header line, then one CSV text chunk per batch of rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    yield buf.getvalue()
+    for rows in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([r[f] for f in fields] for r in rows)
+        yield buf.getvalue()
+
+
+# ============================
+# BINARY FORMATS (pyarrow, imported on first use)
+# ============================
+def arrow_schema(fields):
+    import pyarrow as pa
+
+    types = {
+        "customer_id": pa.string(),
+        "recency": pa.int32(),
+        "frequency": pa.int32(),
+        "monetary": pa.float64(),
+        "cluster": pa.int32(),
+    }
+    return pa.schema([(f, types[f]) for f in fields])
+
+
+def record_batch(rows, columns, schema):
+    """Typed RecordBatch of tuple rows whose values are named by `columns`."""
+    import pyarrow as pa
+
+    return pa.RecordBatch.from_arrays(
+        [pa.array(list(map(itemgetter(columns.index(f.name)), rows)), type=f.type)
+         for f in schema],
+        schema=schema,
+    )
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only stream handing out the bytes written since the last drain()."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        # Parquet records absolute offsets, so this counts drained bytes too
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def arrow_chunks(batches, columns, fields):
+    """Arrow IPC stream: schema, one record batch per batch of rows, end marker."""
+    import pyarrow as pa
+
+    schema = arrow_schema(fields)
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in batches:
+            writer.write_batch(record_batch(rows, columns, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def parquet_chunks(batches, columns, fields):
+    """Parquet file written row group by row group; the footer comes last."""
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(fields)
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in batches:
+            writer.write_batch(record_batch(rows, columns, schema))
+            yield sink.drain()
+    yield sink.drain()
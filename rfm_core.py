@@ -0,0 +1,378 @@
+"""
+Serving side of the RFM pipeline: loading, cleaning, RFM table, caps and
+scaling, cluster profiles and segment labels.
+
+Only numpy/pandas are imported here so the web workers start fast; the
+training and plotting code (scikit-learn clustering, matplotlib) lives in
+rfm_pipeline, which re-exports these names.
+"""
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import DEFAULT_K, KLLSketch
+
+RFM_INPUT_COLUMNS = ["CustomerID", "InvoiceNo", "InvoiceDate", "Quantity", "UnitPrice"]
+
+
+# ============================
+# LOAD DATA
+# ============================
+def load_data(path, use_cache=True):
+    """Load dataset from Excel or CSV (or its columnar cache, if built)."""
+    if use_cache:
+        from upload_cache import load_cached
+
+        df = load_cached(path)
+        if df is not None:
+            return df
+
+    if path.lower().endswith(".xlsx"):
+        from xlsx_stream import read_excel_streaming
+
+        df = read_excel_streaming(path)
+    elif path.lower().endswith(".xls"):
+        df = pd.read_excel(path)
+    elif path.lower().endswith(".csv"):
+        df = pd.read_csv(path)
+    else:
+        raise ValueError("Unsupported file format. Provide .xlsx, .xls or .csv")
+    return df
+
+
+# ============================
+# BASIC CLEANING
+# ============================
+CLEANING_RULES = ["missing_customer", "bad_quantity", "bad_price", "bad_date"]
+
+
+def _downcast_quantity(qty):
+    """int32 when every value is a whole number in range, else float64."""
+    int32 = np.iinfo(np.int32)
+    if len(qty) == 0 or qty.min() < int32.min or qty.max() > int32.max:
+        return qty.astype("float64")
+    if qty.dtype.kind in "iu" or (qty % 1 == 0).all():
+        return qty.astype("int32")
+    return qty.astype("float64")
+
+
+def clean_transactions(df):
+    """
+    Single-pass cleaning engine shared by the pipeline, the web service
+    and the streaming reader.
+
+    One boolean mask drops rows with a missing CustomerID, a non-numeric
+    or non-positive Quantity/UnitPrice, or an unparseable InvoiceDate;
+    kept rows are materialized once (no full-frame copy). Amount is
+    computed in float64 before Quantity/UnitPrice are downcast to
+    int32/float32, so Monetary is unchanged.
+
+    Returns (clean_df, report) where report counts the rows dropped by
+    each rule (a row is attributed to the first rule it fails).
+    """
+    # numeric columns are used as they are (no copy); text is coerced
+    qty = pd.to_numeric(df["Quantity"], errors="coerce").to_numpy()
+    price = pd.to_numeric(df["UnitPrice"], errors="coerce").to_numpy()
+
+    rules = [
+        ("missing_customer", df["CustomerID"].notna().to_numpy()),
+        ("bad_quantity", qty > 0),
+        ("bad_price", price > 0),
+    ]
+    keep = np.ones(len(df), dtype=bool)
+    dropped = {}
+    for name, ok in rules:
+        dropped[name] = int((keep & ~ok).sum())
+        keep &= ok
+
+    # dates are only parsed for rows that survived the cheap rules
+    dates = df["InvoiceDate"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        parsed = pd.to_datetime(dates.to_numpy()[keep], errors="coerce")
+        date_ok = parsed.notna()
+        dropped["bad_date"] = int((~date_ok).sum())
+        keep[keep] = date_ok
+        dates = parsed[date_ok].to_numpy()
+    else:
+        date_ok = dates.notna().to_numpy()
+        dropped["bad_date"] = int((keep & ~date_ok).sum())
+        keep &= date_ok
+        dates = dates.to_numpy()[keep]
+
+    qty = qty[keep]
+    price = price[keep].astype("float64", copy=False)
+    columns = {}
+    for col in df.columns:
+        if col == "Quantity":
+            columns[col] = _downcast_quantity(qty)
+        elif col == "UnitPrice":
+            columns[col] = price.astype("float32")
+        elif col == "InvoiceDate":
+            columns[col] = dates
+        elif isinstance(df[col].dtype, pd.CategoricalDtype):
+            # keep the (memory-mapped cache) categories, filter the codes
+            columns[col] = pd.Categorical.from_codes(
+                df[col].cat.codes.to_numpy()[keep], dtype=df[col].dtype
+            )
+        else:
+            columns[col] = df[col].to_numpy()[keep]
+    columns["Amount"] = qty * price
+
+    clean = pd.DataFrame(columns, index=df.index[keep], copy=False)
+    report = {"rows_in": len(df), "rows_out": len(clean), "dropped": dropped}
+    return clean, report
+
+
+def basic_cleaning(df):
+    """Drop missing customer IDs and remove non-positive quantity/unitprice."""
+    return clean_transactions(df)[0]
+
+
+# ============================
+# COMPUTE RFM
+# ============================
+NS_PER_DAY = 86_400 * 10**9
+
+
+def compute_rfm(df, reference_date=None):
+    """
+    Compute RFM table per CustomerID.
+
+    Fully vectorized: customers and invoices are factorized to integer
+    codes, Recency uses integer-day arithmetic on the per-customer max
+    date and Frequency counts distinct (customer, invoice) code pairs.
+    """
+    if reference_date is None:
+        reference_date = df["InvoiceDate"].max() + dt.timedelta(days=1)
+
+    cust_codes, customers = pd.factorize(df["CustomerID"], sort=True)
+    keep = cust_codes >= 0
+    cust_codes = cust_codes[keep]
+    n_customers = len(customers)
+
+    # Recency: whole days between reference date and last invoice
+    last_date = df["InvoiceDate"][keep].groupby(cust_codes).max()
+    recency = (pd.Timestamp(reference_date).value - last_date.values.view("int64")) // NS_PER_DAY
+
+    # Frequency: distinct invoices per customer
+    inv_codes, invoices = pd.factorize(df["InvoiceNo"])
+    inv_codes = inv_codes[keep]
+    has_inv = inv_codes >= 0
+    pairs = pd.unique(cust_codes[has_inv].astype("int64") * len(invoices) + inv_codes[has_inv])
+    frequency = np.bincount(pairs // max(len(invoices), 1), minlength=n_customers)
+
+    # Monetary: same cython sum as a groupby on CustomerID
+    monetary = df["Amount"][keep].groupby(cust_codes).sum()
+
+    rfm = pd.DataFrame({
+        "CustomerID": customers,
+        "Recency": recency.astype("int64"),
+        "Frequency": frequency.astype("int64"),
+        "Monetary": monetary.values
+    })
+    return rfm
+
+
+# ============================
+# CAP OUTLIERS + LOG TRANSFORM
+# ============================
+CAP_QUANTILE = 0.99
+CAP_COLUMNS = {"q99_f": "Frequency", "q99_m": "Monetary"}
+
+
+def cap_values(rfm, rank_error=None):
+    """
+    99th-percentile caps for Frequency and Monetary.
+
+    With `rank_error` the caps come from KLL sketches (see cap_sketches)
+    instead of an exact sort: each cap sits within that fraction of the
+    customers of the exact 99th percentile (~99% confidence).
+    """
+    if rank_error:
+        return caps_from_sketches(cap_sketches(rfm, KLLSketch.for_rank_error(rank_error).k))
+    return {
+        "q99_f": rfm["Frequency"].quantile(0.99),
+        "q99_m": rfm["Monetary"].quantile(0.99)
+    }
+
+
+def cap_sketches(rfm, k=DEFAULT_K, seed=0):
+    """
+    Frequency and Monetary sketches of one RFM table (or one partition /
+    chunk of customers). Sketches of disjoint customer sets combine with
+    merge_cap_sketches; caps_from_sketches turns them into caps.
+    """
+    return {
+        cap: KLLSketch(k, seed).update(rfm[col].to_numpy(dtype="float64"))
+        for cap, col in CAP_COLUMNS.items()
+    }
+
+
+def merge_cap_sketches(sketches):
+    """Fold a list of cap_sketches results into one (order does not matter for the bound)."""
+    merged = None
+    for part in sketches:
+        if merged is None:
+            merged = part
+        else:
+            for cap, sketch in part.items():
+                merged[cap].merge(sketch)
+    return merged
+
+
+def caps_from_sketches(sketches):
+    return {cap: sketch.quantile(CAP_QUANTILE) for cap, sketch in sketches.items()}
+
+
+def cap_error_report(rfm, caps, exact=None):
+    """
+    Approximate caps against the exact ones: value error and the rank
+    error (how far, as a fraction of customers, the approximate cap is
+    from the 99th percentile).
+    """
+    exact = exact or cap_values(rfm)
+    report = {}
+    for cap, col in CAP_COLUMNS.items():
+        values = np.sort(rfm[col].dropna().to_numpy(dtype="float64"))
+        n = max(len(values), 1)
+        below = np.searchsorted(values, caps[cap], side="left") / n
+        at_most = np.searchsorted(values, caps[cap], side="right") / n
+        rank_error = 0.0 if below <= CAP_QUANTILE <= at_most else \
+            min(abs(below - CAP_QUANTILE), abs(at_most - CAP_QUANTILE))
+        diff = float(caps[cap]) - float(exact[cap])
+        report[cap] = {
+            "exact": float(exact[cap]),
+            "approx": float(caps[cap]),
+            "abs_error": abs(diff),
+            "rel_error": abs(diff) / abs(float(exact[cap])) if exact[cap] else 0.0,
+            "rank_error": float(rank_error),
+        }
+    return report
+
+
+class RfmScaler:
+    """
+    StandardScaler without the scikit-learn import.
+
+    fit() follows sklearn's arithmetic (nansum mean, corrected two-pass
+    variance, constant features scaled by 1) so the scaled values -- and
+    the labels the model assigns to them -- are bit-for-bit the same.
+    """
+
+    def __init__(self, mean=None, scale=None, feature_names=None):
+        if mean is not None:
+            self.mean_ = np.asarray(mean, dtype="float64")
+            self.scale_ = np.asarray(scale, dtype="float64")
+            self.var_ = self.scale_ ** 2
+            self.n_features_in_ = len(self.mean_)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @staticmethod
+    def _matrix(X):
+        return np.array(X, dtype="float64", copy=True)
+
+    def fit(self, X):
+        if hasattr(X, "columns"):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        X = self._matrix(X)
+        n = np.sum(~np.isnan(X), axis=0)
+        total = np.nansum(X, axis=0)
+        self.mean_ = total / n
+
+        diff = X - total / n
+        correction = np.nansum(diff, axis=0)
+        diff **= 2
+        self.var_ = (np.nansum(diff, axis=0) - correction ** 2 / n) / n
+
+        eps = np.finfo(np.float64).eps
+        constant = self.var_ <= n * eps * self.var_ + (n * self.mean_ * eps) ** 2
+        scale = np.sqrt(self.var_)
+        scale[constant | (scale < 10 * eps)] = 1.0
+        self.scale_ = scale
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def transform(self, X):
+        X = self._matrix(X)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+    def fit_transform(self, X):
+        return self.fit(X).transform(X)
+
+
+def cap_and_log_transform(rfm, params=None):
+    """
+    Cap extreme values (99th percentile), log-transform, then scale.
+
+    `params` reuses an earlier fit instead of fitting on `rfm`: caps as
+    returned by cap_values, plus an optional fitted "scaler".
+    """
+    rfm_proc = rfm.copy()
+    params = params or {}
+
+    caps = params if "q99_f" in params else cap_values(rfm_proc)
+    Q99_F = caps["q99_f"]
+    Q99_M = caps["q99_m"]
+
+    rfm_proc["Frequency_Capped"] = np.where(rfm_proc["Frequency"] > Q99_F, Q99_F, rfm_proc["Frequency"])
+    rfm_proc["Monetary_Capped"] = np.where(rfm_proc["Monetary"] > Q99_M, Q99_M, rfm_proc["Monetary"])
+    rfm_proc["Recency_Capped"] = rfm_proc["Recency"]
+
+    rfm_log = pd.DataFrame({
+        "R_log": np.log(rfm_proc["Recency_Capped"] + 1),
+        "F_log": np.log(rfm_proc["Frequency_Capped"] + 1),
+        "M_log": np.log(rfm_proc["Monetary_Capped"] + 1)
+    })
+
+    scaler = params.get("scaler")
+    if scaler is None:
+        scaler = RfmScaler()
+        rfm_scaled = scaler.fit_transform(rfm_log)
+    else:
+        rfm_scaled = scaler.transform(rfm_log)
+
+    rfm_scaled_df = pd.DataFrame(
+        rfm_scaled,
+        columns=["R_log_sc", "F_log_sc", "M_log_sc"],
+        index=rfm_proc.index
+    )
+
+    return rfm_proc, rfm_log, rfm_scaled_df, scaler
+
+
+# ============================
+# CLUSTER PROFILE
+# ============================
+def build_cluster_profile(rfm, cluster_col="Cluster"):
+    """Mean R/F/M, customer count and share per cluster."""
+    cluster_profile = rfm.groupby(cluster_col).agg(
+        Recency=("Recency", "mean"),
+        Frequency=("Frequency", "mean"),
+        Monetary=("Monetary", "mean"),
+        Count=("CustomerID", "count")
+    )
+    cluster_profile.index.name = "Cluster"
+    cluster_profile["Percentage"] = cluster_profile["Count"] / cluster_profile["Count"].sum() * 100
+    return cluster_profile
+
+
+# ============================
+# AUTOMATIC SEGMENT LABELING
+# ============================
+def label_segments_auto(cluster_profile):
+    """Manual cluster labeling sesuai definisi Google Docs."""
+    
+    mapping = {
+	0: "Pelanggan yang Tidak Aktif/Hilang",
+        1: "Champion/Pelanggan Setia",
+        2: "Potensi Setia/Pelanggan yang Membutuhkan Perhatian",
+        3: "Pelanggan Baru/Berisiko",
+        4: "Pembelanja Besar/Pelanggan Baru Bernilai Tinggi"
+    }
+    
+    cluster_profile = cluster_profile.copy()
+    cluster_profile["Segment"] = cluster_profile.index.map(mapping)
+    return cluster_profile
@@ -0,0 +1,319 @@
+import json
+import datetime as dt
+import pandas as pd
+
+from rfm_core import RfmScaler, basic_cleaning, cap_values, cap_and_log_transform
+from rfm_stream import RfmAccumulator, iter_chunks
+from rfm_writer import normalize_customer_ids, write_rfm_results, _placeholder
+
+STATE_COLUMNS = ["customer_id", "last_purchase", "frequency", "monetary", "recency", "cluster"]
+LOOKUP_BATCH = 1000
+
+
+# ============================
+# DELTA
+# ============================
+def read_delta(filepath, chunksize=100_000):
+    """
+    Per-customer state of a file holding only new transactions: last
+    purchase, distinct invoices and summed Amount.
+    """
+    acc = RfmAccumulator()
+    try:
+        for chunk in iter_chunks(filepath, chunksize):
+            acc.update(basic_cleaning(chunk))
+
+        delta = pd.DataFrame({
+            "last_purchase": acc.last_date,
+            "frequency": acc.frequency(),
+            "monetary": acc.amount,
+        })
+    finally:
+        acc.close()
+    delta["customer_id"] = normalize_customer_ids(delta.index.values).values
+    return delta.reset_index(drop=True)[["customer_id", "last_purchase", "frequency", "monetary"]]
+
+
+def merge_state(state, delta):
+    """
+    Fold a delta into the stored state of the same customers.
+
+    Invoices of a delta are assumed new, so distinct-invoice counts add up.
+    """
+    both = pd.concat([state[delta.columns], delta], ignore_index=True)
+    return both.groupby("customer_id", sort=True).agg(
+        last_purchase=("last_purchase", "max"),
+        frequency=("frequency", "sum"),
+        monetary=("monetary", "sum"),
+    ).reset_index()
+
+
+# ============================
+# STATE STORE
+# ============================
+def _empty_state():
+    state = pd.DataFrame({c: pd.Series(dtype="object") for c in STATE_COLUMNS})
+    state["last_purchase"] = pd.Series(dtype="datetime64[ns]")
+    return state
+
+
+def _state_frame(rows):
+    if not rows:
+        return _empty_state()
+    state = pd.DataFrame(rows, columns=STATE_COLUMNS)
+    state["last_purchase"] = pd.to_datetime(state["last_purchase"])
+    state["frequency"] = state["frequency"].astype("int64")
+    state["monetary"] = state["monetary"].astype("float64")
+    return state
+
+
+def load_state(conn, user_id, customer_ids=None):
+    """Stored state of a user's customers (all of them when ids is None)."""
+    ph = _placeholder(conn)
+    head = f"SELECT {', '.join(STATE_COLUMNS)} FROM customer_state WHERE user_id={ph}"
+    cur = conn.cursor()
+    rows = []
+    try:
+        if customer_ids is None:
+            cur.execute(head, (user_id,))
+            rows = cur.fetchall()
+        else:
+            ids = list(customer_ids)
+            for start in range(0, len(ids), LOOKUP_BATCH):
+                batch = ids[start:start + LOOKUP_BATCH]
+                cur.execute(
+                    head + f" AND customer_id IN ({', '.join([ph] * len(batch))})",
+                    [user_id] + batch
+                )
+                rows.extend(cur.fetchall())
+    finally:
+        cur.close()
+    return _state_frame(rows)
+
+
+def save_state(conn, user_id, state, batch_size=1000):
+    """Replace the stored rows of the customers in `state` (no commit)."""
+    ph = _placeholder(conn)
+    ids = state["customer_id"].tolist()
+    rows = [
+        (int(user_id), cid, last.to_pydatetime(), int(f), float(m), int(r), int(c))
+        for cid, last, f, m, r, c in zip(
+            ids, state["last_purchase"], state["frequency"], state["monetary"],
+            state["recency"], state["cluster"]
+        )
+    ]
+
+    cur = conn.cursor()
+    try:
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            cur.execute(
+                f"DELETE FROM customer_state WHERE user_id={ph} "
+                f"AND customer_id IN ({', '.join([ph] * len(batch))})",
+                [int(user_id)] + batch
+            )
+        row_sql = "(" + ", ".join([ph] * (len(STATE_COLUMNS) + 1)) + ")"
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            cur.execute(
+                f"INSERT INTO customer_state (user_id, {', '.join(STATE_COLUMNS)}) VALUES "
+                + ", ".join([row_sql] * len(chunk)),
+                [v for row in chunk for v in row]
+            )
+    finally:
+        cur.close()
+
+
+# ============================
+# APPLIED DELTAS
+# ============================
+def lock_user_state(conn, user_id):
+    """
+    Row-lock the user until commit/rollback so deltas of one user apply
+    one at a time (across threads, job processes and web workers).
+    """
+    if _placeholder(conn) == "?":
+        return  # sqlite serializes writers itself and has no FOR UPDATE
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM users WHERE id=%s FOR UPDATE", (user_id,))
+        cur.fetchall()
+    finally:
+        cur.close()
+
+
+def find_applied_delta(conn, user_id, file_id, content_hash=None):
+    """file_id of an earlier delta of this upload (same id or same content), or None."""
+    ph = _placeholder(conn)
+    sql = f"SELECT file_id FROM customer_state_deltas WHERE user_id={ph} AND (file_id={ph}"
+    params = [user_id, file_id]
+    if content_hash:
+        sql += f" OR content_hash={ph}"
+        params.append(content_hash)
+    cur = conn.cursor()
+    try:
+        cur.execute(sql + ") LIMIT 1", params)
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    return None if row is None else row[0]
+
+
+def record_delta(conn, user_id, file_id, content_hash, customers):
+    ph = _placeholder(conn)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            INSERT INTO customer_state_deltas (user_id, file_id, content_hash, customers)
+            VALUES ({ph}, {ph}, {ph}, {ph})
+        """, (int(user_id), int(file_id), content_hash, int(customers)))
+    finally:
+        cur.close()
+
+
+# ============================
+# TRANSFORM PARAMETERS
+# ============================
+def load_params(conn, user_id):
+    """Caps, scaler and reference point persisted by the last full fit."""
+    ph = _placeholder(conn)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT q99_f, q99_m, scaler_mean, scaler_scale, max_purchase, model_version
+        FROM customer_state_params
+        WHERE user_id={ph}
+    """, (user_id,))
+    row = cur.fetchone()
+    cur.close()
+    if row is None:
+        return None
+
+    q99_f, q99_m, mean, scale, max_purchase, model_version = row
+    scaler = RfmScaler(json.loads(mean), json.loads(scale), ["R_log", "F_log", "M_log"])
+    return {
+        "q99_f": q99_f,
+        "q99_m": q99_m,
+        "scaler": scaler,
+        "max_purchase": pd.Timestamp(max_purchase),
+        "model_version": model_version,
+    }
+
+
+def save_params(conn, user_id, params):
+    ph = _placeholder(conn)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DELETE FROM customer_state_params WHERE user_id={ph}", (user_id,))
+        cur.execute(f"""
+            INSERT INTO customer_state_params
+                (user_id, q99_f, q99_m, scaler_mean, scaler_scale, max_purchase, model_version)
+            VALUES ({', '.join([ph] * 7)})
+        """, (
+            int(user_id),
+            float(params["q99_f"]),
+            float(params["q99_m"]),
+            json.dumps(params["scaler"].mean_.tolist()),
+            json.dumps(params["scaler"].scale_.tolist()),
+            params["max_purchase"].to_pydatetime(),
+            params["model_version"],
+        ))
+    finally:
+        cur.close()
+
+
+# ============================
+# SCORING
+# ============================
+def _score(state, reference_date, model, params=None):
+    """Recency against `reference_date`, transform and predict."""
+    rfm = pd.DataFrame({
+        "CustomerID": state["customer_id"].values,
+        "Recency": (reference_date - state["last_purchase"]).dt.days.astype("int64").values,
+        "Frequency": state["frequency"].astype("int64").values,
+        "Monetary": state["monetary"].astype("float64").values,
+    })
+    rfm_proc, _, rfm_scaled_df, scaler = cap_and_log_transform(rfm, params)
+    rfm_proc["cluster"] = model.predict(rfm_scaled_df)
+    return rfm_proc, scaler
+
+
+def apply_delta(conn, user_id, file_id, filepath, model, model_version, rebuild=False,
+                content_hash=None):
+    """
+    Update a user's customer state with the transactions of `filepath`
+    and rescore the affected customers; their rows are written to
+    rfm_results under `file_id`.
+
+    Only customers present in the delta are read, rescored and written,
+    using the caps/scaler of the last full fit. A full refit over the
+    stored state (not the transaction history) runs on the first delta,
+    when the model version changed, or with `rebuild`.
+
+    Each upload (by file_id, or content_hash when known) is folded in at
+    most once: a repeat returns {"already_applied": True, ...} and changes
+    nothing. State, parameters, the applied-delta record and rfm_results
+    are written in one transaction under a per-user row lock.
+    """
+    delta = read_delta(filepath)
+    if delta.empty:
+        # process_delta answers 400; nothing is locked or recorded
+        raise ValueError("no valid transactions in delta")
+
+    lock_user_state(conn, user_id)
+    try:
+        applied = find_applied_delta(conn, user_id, file_id, content_hash)
+    except Exception:
+        conn.rollback()
+        raise
+    if applied is not None:
+        conn.rollback()
+        return {"already_applied": True, "applied_file_id": applied, "delta_customers": len(delta)}
+
+    params = load_params(conn, user_id)
+    full = rebuild or params is None or params["model_version"] != model_version
+
+    stored = load_state(conn, user_id, None if full else delta["customer_id"])
+    known = int(stored["customer_id"].isin(delta["customer_id"]).sum())
+    merged = merge_state(stored, delta)
+
+    # NaT never wins: max() against NaT would return whichever came first
+    candidates = [merged["last_purchase"].max()]
+    if params is not None and not full:
+        candidates.append(params["max_purchase"])
+    max_purchase = max(d for d in candidates if pd.notna(d))
+    reference_date = max_purchase + dt.timedelta(days=1)
+
+    if full:
+        caps = cap_values(pd.DataFrame({
+            "Frequency": merged["frequency"], "Monetary": merged["monetary"]
+        }))
+        rfm_proc, scaler = _score(merged, reference_date, model, caps)
+        params = {**caps, "scaler": scaler}
+    else:
+        rfm_proc, _ = _score(merged, reference_date, model, params)
+
+    merged["recency"] = rfm_proc["Recency"].values
+    merged["cluster"] = rfm_proc["cluster"].values
+
+    changed = rfm_proc[rfm_proc["CustomerID"].isin(delta["customer_id"])]
+    try:
+        save_state(conn, user_id, merged)
+        save_params(conn, user_id, {
+            **params, "max_purchase": max_purchase, "model_version": model_version
+        })
+        record_delta(conn, user_id, file_id, content_hash, len(delta))
+        # commits the whole transaction once at the end (rolls it back on
+        # failure); an intermediate commit would release the user lock
+        write_rfm_results(conn, file_id, changed, commit_every=0)
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        "already_applied": False,
+        "delta_customers": len(delta),
+        "rescored_customers": len(rfm_proc),
+        "new_customers": len(delta) - known,
+        "full_refit": full,
+        "reference_date": reference_date.isoformat(),
+    }
@@ -0,0 +1,215 @@
+"""
+Multi-process map-reduce RFM over hash-partitioned customers.
+
+Input is the memory-mapped Arrow cache of each upload (see upload_cache),
+so workers slice row ranges of the same file instead of receiving
+pickled frames:
+
+- map (one task per row range): clean the slice, hash CustomerID into
+  `partitions` buckets and, per bucket, build partial aggregates -- last
+  invoice date per customer and distinct (customer, invoice) pairs --
+  and spill the (customer, Amount) rows to .npy files.
+- reduce (one task per bucket): merge the partial aggregates and sum the
+  memory-mapped Amount rows of the bucket in original row order.
+
+Monetary is summed from rows rather than from per-slice partial sums
+because pandas' grouped sum is compensated (Kahan): adding partial sums
+differs from one pass in the last bits, summing the same rows in the
+same order does not. The result is identical to clean_transactions +
+compute_rfm on the whole file.
+
+Each reduce task owns its customers outright, so it can also sketch
+their Frequency and Monetary (cap_sketches); the driver merges those
+into the caps of the whole table without another pass over it.
+"""
+import os
+import math
+import shutil
+import tempfile
+import multiprocessing
+import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from rfm_core import (
+    NS_PER_DAY, RFM_INPUT_COLUMNS, CLEANING_RULES, clean_transactions,
+    cap_sketches, merge_cap_sketches,
+)
+
+MIN_CHUNK_ROWS = 50_000
+
+
+def _read_slice(cache, start, stop):
+    import pyarrow.feather as feather
+
+    table = feather.read_table(cache, columns=RFM_INPUT_COLUMNS, memory_map=True)
+    return table.slice(start, stop - start).to_pandas(split_blocks=True)
+
+
+def _keys(col):
+    """Grouping keys: category codes (one dictionary per file) or the values."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy().astype("int64")
+    return col.to_numpy()
+
+
+# ============================
+# MAP
+# ============================
+def _map_slice(task_id, cache, start, stop, partitions, spill_dir):
+    clean, report = clean_transactions(_read_slice(cache, start, stop))
+
+    cust = _keys(clean["CustomerID"])
+    inv = _keys(clean["InvoiceNo"])
+    dates = clean["InvoiceDate"].to_numpy().view("int64")
+    amount = clean["Amount"].to_numpy()
+    bucket = pd.util.hash_array(cust) % partitions
+    if isinstance(clean["InvoiceNo"].dtype, pd.CategoricalDtype):
+        has_inv = inv >= 0
+    else:
+        has_inv = pd.notna(inv)
+
+    parts = {}
+    for p in range(partitions):
+        rows = bucket == p
+        if not rows.any():
+            continue
+        key = cust[rows]
+        with_inv = rows & has_inv
+        parts[p] = {
+            "last": pd.Series(dates[rows]).groupby(key).max(),
+            "pairs": pd.DataFrame({"c": cust[with_inv], "i": inv[with_inv]}).drop_duplicates(),
+        }
+        # amounts stay rows (see module docstring); spilled, read back memory-mapped
+        base = os.path.join(spill_dir, f"{task_id:06d}_{p:04d}")
+        np.save(base + "_key.npy", key, allow_pickle=key.dtype == object)
+        np.save(base + "_amount.npy", amount[rows])
+    max_date = int(dates.max()) if len(dates) else None
+    return task_id, parts, report, max_date
+
+
+# ============================
+# REDUCE
+# ============================
+def _load(path):
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # object keys cannot be memory-mapped
+        return np.load(path, allow_pickle=True)
+
+
+def _reduce_partition(p, parts, task_ids, spill_dir, reference_ns, sketch_k=None):
+    last = pd.concat([part["last"] for part in parts]).groupby(level=0).max()
+    pairs = pd.concat([part["pairs"] for part in parts]).drop_duplicates()
+    frequency = pairs.groupby("c").size().reindex(last.index, fill_value=0)
+
+    bases = [os.path.join(spill_dir, f"{t:06d}_{p:04d}") for t in task_ids]
+    keys = np.concatenate([_load(b + "_key.npy") for b in bases])
+    amount = np.concatenate([_load(b + "_amount.npy") for b in bases])
+    monetary = pd.Series(amount).groupby(keys).sum().reindex(last.index)
+
+    piece = pd.DataFrame({
+        "key": last.index.to_numpy(),
+        "Recency": (reference_ns - last.to_numpy()) // NS_PER_DAY,
+        "Frequency": frequency.to_numpy(),
+        "Monetary": monetary.to_numpy(),
+    })
+    return piece, cap_sketches(piece, sketch_k, seed=p) if sketch_k else None
+
+
+# ============================
+# DRIVER
+# ============================
+def _cache_for(path):
+    from upload_cache import build_cache, cache_path_for, is_fresh
+
+    return cache_path_for(path) if is_fresh(path) else build_cache(path)
+
+
+def _customer_dtype(cache):
+    return _read_slice(cache, 0, 0)["CustomerID"].dtype
+
+
+def compute_rfm_parallel(path, workers=None, chunk_rows=None, partitions=None,
+                         reference_date=None, return_report=False, sketch_k=None):
+    """
+    RFM table of one upload computed on `workers` processes.
+
+    The upload's Arrow cache is built first when missing or stale. With
+    `return_report`, also returns the summed clean_transactions report;
+    with `sketch_k` as well, the report carries the merged cap sketches
+    ("cap_sketches") of the partitions.
+    """
+    workers = workers or os.cpu_count() or 1
+    partitions = partitions or workers
+    from upload_cache import cached_num_rows
+
+    cache = _cache_for(path)
+    n_rows = cached_num_rows(path)
+    chunk_rows = chunk_rows or max(MIN_CHUNK_ROWS, math.ceil(n_rows / (workers * 4)))
+    ranges = [(s, min(s + chunk_rows, n_rows)) for s in range(0, n_rows, chunk_rows)]
+
+    spill_dir = tempfile.mkdtemp(prefix="rfm_mr_", dir=os.path.dirname(cache))
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            mapped = sorted(pool.map(
+                _map_slice, range(len(ranges)), [cache] * len(ranges),
+                [s for s, _ in ranges], [e for _, e in ranges],
+                [partitions] * len(ranges), [spill_dir] * len(ranges),
+            ), key=lambda m: m[0])
+
+            report = {"rows_in": 0, "rows_out": 0, "dropped": dict.fromkeys(CLEANING_RULES, 0)}
+            for _, _, r, _ in mapped:
+                report["rows_in"] += r["rows_in"]
+                report["rows_out"] += r["rows_out"]
+                for rule, n in r["dropped"].items():
+                    report["dropped"][rule] += n
+
+            max_dates = [m for _, _, _, m in mapped if m is not None]
+            if reference_date is None and max_dates:
+                reference_date = pd.Timestamp(max(max_dates)) + dt.timedelta(days=1)
+            reference_ns = pd.Timestamp(reference_date).value if max_dates else 0
+
+            jobs = []
+            for p in range(partitions):
+                tasks = [(t, parts[p]) for t, parts, _, _ in mapped if p in parts]
+                if tasks:
+                    jobs.append(pool.submit(
+                        _reduce_partition, p, [part for _, part in tasks],
+                        [t for t, _ in tasks], spill_dir, reference_ns, sketch_k,
+                    ))
+            reduced = [job.result() for job in jobs]
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    pieces = [piece for piece, _ in reduced]
+    if sketch_k:
+        report["cap_sketches"] = merge_cap_sketches(s for _, s in reduced)
+
+    rfm = _assemble(pieces, _customer_dtype(cache))
+    return (rfm, report) if return_report else rfm
+
+
+def _assemble(pieces, customer_dtype):
+    """Concatenate the buckets in compute_rfm's customer order and dtypes."""
+    if pieces:
+        merged = pd.concat(pieces, ignore_index=True).sort_values("key", kind="stable")
+    else:
+        merged = pd.DataFrame({"key": [], "Recency": [], "Frequency": [], "Monetary": []})
+
+    keys = merged["key"].to_numpy()
+    if isinstance(customer_dtype, pd.CategoricalDtype):
+        customers = pd.Categorical.from_codes(keys.astype("int64"), dtype=customer_dtype)
+    else:
+        customers = keys.astype(customer_dtype)
+
+    return pd.DataFrame({
+        "CustomerID": customers,
+        "Recency": merged["Recency"].to_numpy().astype("int64"),
+        "Frequency": merged["Frequency"].to_numpy().astype("int64"),
+        "Monetary": merged["Monetary"].to_numpy().astype("float64"),
+    })
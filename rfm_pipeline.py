@@ -1,178 +1,254 @@
+"""
+RFM training pipeline: K sweep, final/alternative clustering models,
+plots and the CLI.
+
+scikit-learn, joblib and matplotlib are imported inside the functions
+that use them, so importing this module (or the rfm_core names it
+re-exports) stays cheap.
+"""
 import os
+import json
+import time
 import argparse
 import warnings
 import pandas as pd
 import numpy as np
-import datetime as dt
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans, MiniBatchKMeans, DBSCAN, AgglomerativeClustering
-from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
-import joblib
-import matplotlib.pyplot as plt
 
-warnings.filterwarnings("ignore")
+from instrumentation import trace, span
+from scalable_clustering import SCALABLE_ABOVE, SAMPLE_SIZE
+from rfm_plots import PLOT_MODES, PLOT_MAX_POINTS
+from quantile_sketch import k_for_rank_error, rank_error_for_k
+from rfm_core import (
+    RFM_INPUT_COLUMNS, CLEANING_RULES, NS_PER_DAY, RfmScaler,
+    load_data, clean_transactions, basic_cleaning, compute_rfm,
+    cap_values, cap_sketches, caps_from_sketches, cap_error_report,
+    cap_and_log_transform, build_cluster_profile, label_segments_auto,
+)
 
+warnings.filterwarnings("ignore")
 
 # ============================
-# LOAD DATA
+# EVALUATE BEST K
 # ============================
-def load_data(path):
-    """Load dataset from Excel or CSV."""
-    if path.lower().endswith(".xlsx") or path.lower().endswith(".xls"):
-        df = pd.read_excel(path)
-    elif path.lower().endswith(".csv"):
-        df = pd.read_csv(path)
-    else:
-        raise ValueError("Unsupported file format. Provide .xlsx, .xls or .csv")
-    return df
+def _kmeans_for_k(rfm_scaled, k, init="k-means++", n_init=10):
+    from sklearn.cluster import KMeans
 
+    start = time.perf_counter()
+    km = KMeans(n_clusters=k, random_state=42, n_init=n_init, init=init)
+    km.fit(rfm_scaled)
+    return km, time.perf_counter() - start
 
-# ============================
-# BASIC CLEANING
-# ============================
-def basic_cleaning(df):
-    """Drop missing customer IDs and remove non-positive quantity/unitprice."""
-    df = df.copy()
-    df.dropna(subset=["CustomerID"], inplace=True)
-    df = df[df["Quantity"] > 0]
-    df = df[df["UnitPrice"] > 0]
 
-    # ensure InvoiceDate is datetime
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
+def _score_k(rfm_scaled, k, labels):
+    from sklearn.metrics import silhouette_score
 
-    # compute Amount
-    df["Amount"] = df["Quantity"] * df["UnitPrice"]
+    start = time.perf_counter()
+    score = silhouette_score(rfm_scaled, labels)
+    return score, time.perf_counter() - start
 
-    return df
 
+def _fit_and_score_k(rfm_scaled, k):
+    km, fit_seconds = _kmeans_for_k(rfm_scaled, k)
+    score, sil_seconds = _score_k(rfm_scaled, k, km.labels_)
+    return km.inertia_, score, fit_seconds, sil_seconds
 
-# ============================
-# COMPUTE RFM
-# ============================
-def compute_rfm(df, reference_date=None):
-    """Compute RFM table per CustomerID."""
-    if reference_date is None:
-        reference_date = df["InvoiceDate"].max() + dt.timedelta(days=1)
 
-    rfm = df.groupby("CustomerID").agg({
-        "InvoiceDate": lambda x: (reference_date - x.max()).days,
-        "InvoiceNo": "nunique",
-        "Amount": "sum"
-    }).reset_index()
+def _warm_init(rfm_scaled, centers):
+    """Previous centers plus the point farthest from all of them."""
+    dist = ((rfm_scaled[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    return np.vstack([centers, rfm_scaled[int(np.argmax(dist))]])
 
-    rfm.columns = ["CustomerID", "Recency", "Frequency", "Monetary"]
-    return rfm
 
+def evaluate_k_options(rfm_scaled, k_min=2, k_max=10, output_dir="./output",
+                       jobs=1, warm_start=False, plots=False):
+    """
+    Compute WCSS & Silhouette scores for K range (plots saved if `plots`).
 
-# ============================
-# CAP OUTLIERS + LOG TRANSFORM
-# ============================
-def cap_and_log_transform(rfm):
-    """Cap extreme values (99th percentile), log-transform, then scale."""
-    rfm_proc = rfm.copy()
-
-    Q99_F = rfm_proc["Frequency"].quantile(0.99)
-    Q99_M = rfm_proc["Monetary"].quantile(0.99)
-
-    rfm_proc["Frequency_Capped"] = np.where(rfm_proc["Frequency"] > Q99_F, Q99_F, rfm_proc["Frequency"])
-    rfm_proc["Monetary_Capped"] = np.where(rfm_proc["Monetary"] > Q99_M, Q99_M, rfm_proc["Monetary"])
-    rfm_proc["Recency_Capped"] = rfm_proc["Recency"]
-
-    rfm_log = pd.DataFrame({
-        "R_log": np.log(rfm_proc["Recency_Capped"] + 1),
-        "F_log": np.log(rfm_proc["Frequency_Capped"] + 1),
-        "M_log": np.log(rfm_proc["Monetary_Capped"] + 1)
-    })
-
-    scaler = StandardScaler()
-    rfm_scaled = scaler.fit_transform(rfm_log)
-
-    rfm_scaled_df = pd.DataFrame(
-        rfm_scaled,
-        columns=["R_log_sc", "F_log_sc", "M_log_sc"],
-        index=rfm_proc.index
-    )
-
-    return rfm_proc, rfm_log, rfm_scaled_df, scaler
-
+    K values are fitted and scored on `jobs` workers (-1 = all cores).
+    With `warm_start`, each K is fitted once from the previous K's centers
+    plus one new center, so fits run in order and only the silhouettes
+    are spread over the workers.
+    """
+    import joblib
 
-# ============================
-# EVALUATE BEST K
-# ============================
-def evaluate_k_options(rfm_scaled, k_min=2, k_max=10, output_dir="./output"):
-    """Compute WCSS & Silhouette scores for K range and save plots."""
-    wcss = []
-    sil_scores = []
+    rfm_scaled = np.asarray(rfm_scaled)
     K_range = range(k_min, k_max + 1)
 
-    for k in K_range:
-        km = KMeans(n_clusters=k, random_state=42, n_init=10)
-        km.fit(rfm_scaled)
-        wcss.append(km.inertia_)
-        sil_scores.append(silhouette_score(rfm_scaled, km.labels_))
-
-    # save silhouette plot
-    plt.figure(figsize=(8, 5))
-    plt.bar(list(K_range), sil_scores)
-    plt.xlabel("K")
-    plt.ylabel("Silhouette Score")
-    plt.title("Silhouette Score per K")
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, "silhouette_per_k.png"))
-    plt.close()
-
-    # elbow plot
-    plt.figure(figsize=(8, 5))
-    plt.plot(list(K_range), wcss, marker="o", linestyle="--")
-    plt.xlabel("K")
-    plt.ylabel("WCSS")
-    plt.title("Elbow Method")
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, "elbow_wcss.png"))
-    plt.close()
+    if warm_start:
+        models, fit_seconds = [], []
+        centers = None
+        for k in K_range:
+            if centers is None:
+                km, secs = _kmeans_for_k(rfm_scaled, k)
+            else:
+                km, secs = _kmeans_for_k(rfm_scaled, k, _warm_init(rfm_scaled, centers), n_init=1)
+            centers = km.cluster_centers_
+            models.append(km)
+            fit_seconds.append(secs)
+
+        scored = joblib.Parallel(n_jobs=jobs)(
+            joblib.delayed(_score_k)(rfm_scaled, k, km.labels_) for k, km in zip(K_range, models)
+        )
+        wcss = [km.inertia_ for km in models]
+        sil_scores = [score for score, _ in scored]
+        sil_seconds = [secs for _, secs in scored]
+    else:
+        results = joblib.Parallel(n_jobs=jobs)(
+            joblib.delayed(_fit_and_score_k)(rfm_scaled, k) for k in K_range
+        )
+        wcss, sil_scores, fit_seconds, sil_seconds = (list(col) for col in zip(*results))
+
+    if plots:
+        import matplotlib.pyplot as plt
+
+        # save silhouette plot
+        plt.figure(figsize=(8, 5))
+        plt.bar(list(K_range), sil_scores)
+        plt.xlabel("K")
+        plt.ylabel("Silhouette Score")
+        plt.title("Silhouette Score per K")
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, "silhouette_per_k.png"))
+        plt.close()
+
+        # elbow plot
+        plt.figure(figsize=(8, 5))
+        plt.plot(list(K_range), wcss, marker="o", linestyle="--")
+        plt.xlabel("K")
+        plt.ylabel("WCSS")
+        plt.title("Elbow Method")
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, "elbow_wcss.png"))
+        plt.close()
 
     best_k = K_range[int(np.argmax(sil_scores))]
-    return {"K_range": list(K_range), "wcss": wcss, "silhouette": sil_scores, "best_k_by_silhouette": best_k}
+    timings = [
+        {"k": k, "fit_seconds": round(f, 4), "silhouette_seconds": round(s, 4)}
+        for k, f, s in zip(K_range, fit_seconds, sil_seconds)
+    ]
+    return {"K_range": list(K_range), "wcss": wcss, "silhouette": sil_scores,
+            "best_k_by_silhouette": best_k, "timings": timings}
 
 
 # ============================
 # FINAL MODELS + SAVE RESULTS
 # ============================
-def fit_and_save_models(rfm_orig, rfm_scaled_df, k_final=5, output_dir="./output"):
-    """Fit KMeans + alternative clustering models and save results."""
+# name -> (metrics key, label column in rfm_clustered.csv)
+MODELS = {
+    "kmeans": ("KMeans", "Cluster"),
+    "minibatch": ("MiniBatchKMeans", "MiniBatch_Cluster"),
+    "hierarchical": ("AgglomerativeClustering", "Hierarchical_Cluster"),
+    "dbscan": ("DBSCAN", "DBSCAN_Cluster"),
+}
+
+
+def _fit_labels(name, rfm_scaled, k_final, cluster_mode, scalable_above, sample_size):
+    """Labels, the estimator (KMeans/MiniBatch only) and the fit mode info."""
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    from scalable_clustering import fit_agglomerative, fit_dbscan
+
+    if name == "hierarchical":
+        labels, info = fit_agglomerative(
+            rfm_scaled, k_final, cluster_mode, scalable_above, sample_size
+        )
+        return labels, None, info
+    if name == "dbscan":
+        labels, info = fit_dbscan(
+            rfm_scaled, 0.5, 5, cluster_mode, scalable_above, sample_size
+        )
+        return labels, None, info
+
+    if name == "kmeans":
+        model = KMeans(n_clusters=k_final, random_state=42, n_init=10)
+    elif name == "minibatch":
+        model = MiniBatchKMeans(n_clusters=k_final, random_state=42, n_init=10)
+    else:
+        raise ValueError(f"Unknown model: {name}")
+    return model.fit_predict(rfm_scaled), model, {"mode": "full", "fit_rows": len(rfm_scaled)}
+
+
+def _fit_model(name, rfm_scaled, k_final, cluster_mode="auto",
+               scalable_above=SCALABLE_ABOVE, sample_size=SAMPLE_SIZE):
+    """
+    Fit one model (in a worker process); return its labels, the fitted
+    estimator for KMeans only, and fit time / peak traced memory / fit
+    mode. The KMeans quality metrics are computed here too, next to the fit.
+    """
+    import tracemalloc
+    from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    labels, model, info = _fit_labels(
+        name, rfm_scaled, k_final, cluster_mode, scalable_above, sample_size
+    )
+    stats = {
+        "fit_seconds": round(time.perf_counter() - start, 4),
+        "peak_mb": round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1),
+        **info,
+    }
+    tracemalloc.stop()
+
+    if name == "kmeans":
+        start = time.perf_counter()
+        stats["Silhouette"] = silhouette_score(rfm_scaled, labels)
+        stats["Davies-Bouldin"] = davies_bouldin_score(rfm_scaled, labels)
+        stats["Calinski-Harabasz"] = calinski_harabasz_score(rfm_scaled, labels)
+        stats["metrics_seconds"] = round(time.perf_counter() - start, 4)
+    return name, labels, model if name == "kmeans" else None, stats
+
+
+def fit_and_save_models(rfm_orig, rfm_scaled_df, k_final=5, output_dir="./output",
+                        models=tuple(MODELS), jobs=1, cluster_mode="auto",
+                        scalable_above=SCALABLE_ABOVE, sample_size=SAMPLE_SIZE):
+    """
+    Fit KMeans + alternative clustering models and save results.
+
+    The selected `models` (KMeans is required: it is the saved model) are
+    independent, so they are fitted on `jobs` worker processes (-1 = all
+    cores); metrics hold KMeans' scores plus fit time and peak memory of
+    every model.
+
+    Agglomerative/DBSCAN are quadratic in the customer count: with
+    `cluster_mode` "auto" they are fitted on a `sample_size` stratified
+    sample above `scalable_above` customers (see scalable_clustering);
+    "full"/"sample" force a mode. The mode used is recorded per model in
+    the metrics, which are also saved as model_metrics.json.
+    """
+    import joblib
+    from centroid_scorer import export_centroids
+
+    if "kmeans" not in models:
+        raise ValueError("models must include 'kmeans' (the saved scoring model)")
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        raise ValueError(f"Unknown models: {', '.join(sorted(unknown))}")
+
     os.makedirs(output_dir, exist_ok=True)
+    selected = [name for name in MODELS if name in models]
 
-    # KMeans final model
-    kmeans_final = KMeans(n_clusters=k_final, random_state=42, n_init=10)
-    labels_km = kmeans_final.fit_predict(rfm_scaled_df)
-    rfm_orig["Cluster"] = labels_km
-
-    # Save the model
-    joblib.dump(kmeans_final, os.path.join(output_dir, "rfm_kmeans.model"))
-
-    # MiniBatch
-    minibatch = MiniBatchKMeans(n_clusters=k_final, random_state=42, n_init=10)
-    rfm_orig["MiniBatch_Cluster"] = minibatch.fit_predict(rfm_scaled_df)
-
-    # Hierarchical
-    hier = AgglomerativeClustering(n_clusters=k_final)
-    rfm_orig["Hierarchical_Cluster"] = hier.fit_predict(rfm_scaled_df)
-
-    # DBSCAN
-    dbscan = DBSCAN(eps=0.5, min_samples=5)
-    rfm_orig["DBSCAN_Cluster"] = dbscan.fit_predict(rfm_scaled_df)
-
-    # Metrics
-    metrics = {
-        "KMeans": {
-            "Silhouette": silhouette_score(rfm_scaled_df, rfm_orig["Cluster"]),
-            "Davies-Bouldin": davies_bouldin_score(rfm_scaled_df, rfm_orig["Cluster"]),
-            "Calinski-Harabasz": calinski_harabasz_score(rfm_scaled_df, rfm_orig["Cluster"])
-        }
-    }
+    results = joblib.Parallel(n_jobs=min(jobs, len(selected)) if jobs > 0 else jobs)(
+        joblib.delayed(_fit_model)(
+            name, rfm_scaled_df, k_final, cluster_mode, scalable_above, sample_size
+        )
+        for name in selected
+    )
 
-    # Save clustered CSV
+    metrics = {}
+    for name, labels, model, stats in results:
+        key, column = MODELS[name]
+        rfm_orig[column] = labels
+        metrics[key] = stats
+        if model is not None:
+            # Save the model (+ its centroid scoring artifact for the web service)
+            model_path = os.path.join(output_dir, "rfm_kmeans.model")
+            joblib.dump(model, model_path)
+            export_centroids(model_path)
+
+    # Save clustered CSV + metrics
     rfm_orig.to_csv(os.path.join(output_dir, "rfm_clustered.csv"), index=False)
+    with open(os.path.join(output_dir, "model_metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=2, default=float)
 
     return rfm_orig, metrics
 
@@ -180,73 +256,29 @@ def fit_and_save_models(rfm_orig, rfm_scaled_df, k_final=5, output_dir="./output
 # ============================
 # PLOTS & PROFILES
 # ============================
-def create_plots_and_profiles(rfm, output_dir="./output"):
-    """Create RFM boxplots, scatter, pie chart, and cluster profile."""
+def create_plots_and_profiles(rfm, output_dir="./output", plot_mode="auto", jobs=1,
+                              max_points=PLOT_MAX_POINTS):
+    """
+    Create RFM boxplots, scatter, pie chart, and cluster profile.
+
+    Figures are drawn by rfm_plots: above PLOT_FULL_MAX customers "auto"
+    switches to exact boxplot statistics and a deterministic per-cluster
+    sample (`plot_mode` "hexbin" draws a density plot instead); figures
+    render on `jobs` worker processes and are skipped when their input
+    is unchanged. The cluster profile always uses the full table.
+    """
+    from rfm_plots import render_figures
+
     os.makedirs(output_dir, exist_ok=True)
 
-    # RFM boxplots
-    plt.figure(figsize=(15, 5))
-    for i, col in enumerate(["Recency", "Frequency", "Monetary"], 1):
-        plt.subplot(1, 3, i)
-        plt.boxplot(rfm[col].dropna())
-        plt.title(col)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, "rfm_boxplots.png"))
-    plt.close()
-
-    # Scatter plot
-    plt.figure(figsize=(10, 8))
-    for c in sorted(rfm["Cluster"].unique()):
-        subset = rfm[rfm["Cluster"] == c]
-        plt.scatter(subset["Frequency"], subset["Monetary"], label=f"Cluster {c}", s=20)
-    plt.xlabel("Frequency")
-    plt.ylabel("Monetary")
-    plt.title("Frequency vs Monetary by Cluster")
-    plt.legend()
-    plt.grid(True, linestyle="--", alpha=0.6)
-    plt.savefig(os.path.join(output_dir, "rfm_scatter.png"))
-    plt.close()
-
-    # Pie chart
-    profile = rfm.groupby("Cluster")["CustomerID"].count().rename("Count")
-    profile_ratio = profile / profile.sum() * 100
-
-    plt.figure(figsize=(8, 8))
-    plt.pie(profile_ratio, labels=[f"C{i}" for i in profile_ratio.index], autopct="%1.1f%%")
-    plt.title("Customer Distribution per Cluster")
-    plt.savefig(os.path.join(output_dir, "cluster_pie.png"))
-    plt.close()
+    plots = render_figures(rfm, output_dir, plot_mode, jobs, max_points)
 
     # Export cluster profile
-    cluster_profile = rfm.groupby("Cluster").agg(
-        Recency=("Recency", "mean"),
-        Frequency=("Frequency", "mean"),
-        Monetary=("Monetary", "mean"),
-        Count=("CustomerID", "count")
-    )
-    cluster_profile["Percentage"] = cluster_profile["Count"] / cluster_profile["Count"].sum() * 100
-
+    cluster_profile = build_cluster_profile(rfm)
     cluster_profile.to_csv(os.path.join(output_dir, "cluster_profile.csv"))
+    return plots
 
 
-# ============================
-# AUTOMATIC SEGMENT LABELING
-# ============================
-def label_segments_auto(cluster_profile):
-    """Manual cluster labeling sesuai definisi Google Docs."""
-    
-    mapping = {
-	0: "Pelanggan yang Tidak Aktif/Hilang",
-        1: "Champion/Pelanggan Setia",
-        2: "Potensi Setia/Pelanggan yang Membutuhkan Perhatian",
-        3: "Pelanggan Baru/Berisiko",
-        4: "Pembelanja Besar/Pelanggan Baru Bernilai Tinggi"
-    }
-    
-    cluster_profile = cluster_profile.copy()
-    cluster_profile["Segment"] = cluster_profile.index.map(mapping)
-    return cluster_profile
-
 # ============================
 # ARGPARSE
 # ============================
@@ -257,7 +289,45 @@ def parse_args():
     parser.add_argument("--k", type=int, default=5, help="Final K for KMeans (default 5)")
     parser.add_argument("--kmin", type=int, default=2, help="Min K to evaluate")
     parser.add_argument("--kmax", type=int, default=10, help="Max K to evaluate")
-    return parser.parse_args()
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Compute RFM map-reduce style on N processes (builds the Arrow cache)")
+    parser.add_argument("--chunksize", type=int, default=0,
+                        help="Stream CSV/XLSX input in chunks of N rows (bounded memory)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Parallel workers for the K sweep and model fits (-1 = all cores)")
+    parser.add_argument("--models", default=",".join(MODELS),
+                        help="Comma separated models to fit (kmeans is required): "
+                             + ", ".join(MODELS))
+    parser.add_argument("--warm_start", action="store_true",
+                        help="Seed each K from the previous K's centers (single KMeans run per K)")
+    parser.add_argument("--no_k_plots", action="store_true",
+                        help="Skip the silhouette/elbow plots of the K sweep")
+    parser.add_argument("--cluster_mode", choices=["auto", "full", "sample"], default="auto",
+                        help="Agglomerative/DBSCAN on all customers or a stratified sample "
+                             "(auto = sample above --scalable_above)")
+    parser.add_argument("--scalable_above", type=int, default=SCALABLE_ABOVE,
+                        help="Customer count above which auto mode samples")
+    parser.add_argument("--sample_size", type=int, default=SAMPLE_SIZE,
+                        help="Stratified sample size for sample mode")
+    parser.add_argument("--plot_mode", choices=PLOT_MODES, default="auto",
+                        help="full = every customer, sample = per-cluster sample, "
+                             "hexbin = density (auto = sample for large inputs)")
+    parser.add_argument("--plot_points", type=int, default=PLOT_MAX_POINTS,
+                        help="Points kept by the sample plot mode")
+    parser.add_argument("--cap_error", type=float, default=0.0,
+                        help="Take the 99th-percentile caps from KLL sketches with this "
+                             "rank error, e.g. 0.005 (0 = exact caps)")
+    args = parser.parse_args()
+
+    args.models = [m.strip() for m in args.models.split(",") if m.strip()]
+    unknown = sorted(set(args.models) - set(MODELS))
+    if unknown:
+        parser.error(f"unknown --models: {', '.join(unknown)}")
+    if "kmeans" not in args.models:
+        parser.error("--models must include kmeans (the saved scoring model)")
+    if not 0 <= args.cap_error < 1:
+        parser.error("--cap_error must be in [0, 1)")
+    return args
 
 
 # ============================
@@ -267,30 +337,106 @@ def main():
     args = parse_args()
     os.makedirs(args.output_dir, exist_ok=True)
 
-    print("Loading data...")
-    df = load_data(args.input)
-    print(f"Original rows: {len(df):,}")
-
-    print("Cleaning...")
-    df = basic_cleaning(df)
-    print(f"After cleaning rows: {len(df):,}")
-
-    print("Computing RFM...")
-    rfm = compute_rfm(df)
+    with trace("rfm_pipeline", input=args.input) as t:
+        run_pipeline(args)
+
+    print("Stage timings:")
+    for s in t.spans:
+        rows = f"{s['rows_in'] or '-'} -> {s['rows_out'] or '-'}"
+        print(f"  {s['stage']:<14} {s['seconds']:>9.3f}s  rows {rows:<22} "
+              f"peak RSS +{s['rss_delta_bytes'] / (1024 * 1024):.1f} MB")
+
+
+def run_pipeline(args):
+    sketch_k = k_for_rank_error(args.cap_error) if args.cap_error else None
+    sketches = None
+    if args.workers > 1:
+        from rfm_parallel import compute_rfm_parallel
+
+        print(f"Computing RFM (map-reduce, {args.workers} workers)...")
+        with span("rfm_parallel") as sp:
+            rfm, report = compute_rfm_parallel(
+                args.input, args.workers, return_report=True, sketch_k=sketch_k
+            )
+            sketches = report.get("cap_sketches")
+            sp["rows_in"] = report["rows_in"]
+            sp["rows_out"] = len(rfm)
+            sp["dropped"] = report["dropped"]
+        print(f"Original rows: {report['rows_in']:,}, after cleaning: {report['rows_out']:,}")
+    elif args.chunksize and args.input.lower().endswith((".csv", ".xlsx")):
+        from rfm_stream import compute_rfm_streaming
+
+        print(f"Computing RFM (streaming, chunksize={args.chunksize:,})...")
+        with span("read_stream") as sp:
+            rfm = compute_rfm_streaming(args.input, args.chunksize)
+            sp["rows_out"] = len(rfm)
+    else:
+        print("Loading data...")
+        with span("read") as sp:
+            df = load_data(args.input)
+            sp["rows_out"] = len(df)
+        print(f"Original rows: {len(df):,}")
+
+        print("Cleaning...")
+        with span("clean", len(df)) as sp:
+            df, report = clean_transactions(df)
+            sp["rows_out"] = len(df)
+            sp["dropped"] = report["dropped"]
+        print(f"After cleaning rows: {len(df):,}")
+        for rule, n in report["dropped"].items():
+            print(f"  dropped by {rule}: {n:,}")
+
+        print("Computing RFM...")
+        with span("rfm", len(df)) as sp:
+            rfm = compute_rfm(df)
+            sp["rows_out"] = len(rfm)
+    print(f"Customers: {len(rfm):,}")
 
     print("Transforming data...")
-    rfm_proc, rfm_log, rfm_scaled_df, scaler = cap_and_log_transform(rfm)
+    with span("transform", len(rfm)) as sp:
+        caps = None
+        if sketch_k:
+            # partition sketches from the map-reduce, else one pass over the table
+            caps = caps_from_sketches(sketches or cap_sketches(rfm, sketch_k))
+        rfm_proc, rfm_log, rfm_scaled_df, scaler = cap_and_log_transform(rfm, caps)
+        sp["rows_out"] = len(rfm_scaled_df)
+    if caps:
+        sp["caps"] = cap_error_report(rfm, caps)
+        print(f"Sketch caps (k={sketch_k}, rank error bound {rank_error_for_k(sketch_k):.4f}):")
+        for cap, err in sp["caps"].items():
+            print(f"  {cap}: {err['approx']:.4f} vs exact {err['exact']:.4f} "
+                  f"(rel error {err['rel_error']:.2%}, rank error {err['rank_error']:.4f})")
 
     print("Evaluating K...")
-    eval_res = evaluate_k_options(rfm_scaled_df.values, args.kmin, args.kmax, args.output_dir)
+    with span("evaluate_k", len(rfm_scaled_df)):
+        eval_res = evaluate_k_options(
+            rfm_scaled_df.values, args.kmin, args.kmax, args.output_dir,
+            jobs=args.jobs, warm_start=args.warm_start, plots=not args.no_k_plots
+        )
+    for t in eval_res["timings"]:
+        print(f"  k={t['k']}: fit {t['fit_seconds']:.2f}s, silhouette {t['silhouette_seconds']:.2f}s")
     print("Suggested K by silhouette:", eval_res["best_k_by_silhouette"])
 
     print(f"Fitting final models (k={args.k})...")
-    rfm_clustered, metrics = fit_and_save_models(rfm, rfm_scaled_df, args.k, args.output_dir)
+    with span("fit_models", len(rfm_scaled_df)) as sp:
+        rfm_clustered, metrics = fit_and_save_models(
+            rfm, rfm_scaled_df, args.k, args.output_dir,
+            models=args.models, jobs=args.jobs, cluster_mode=args.cluster_mode,
+            scalable_above=args.scalable_above, sample_size=args.sample_size
+        )
+        sp["rows_out"] = len(rfm_clustered)
+    for name, m in metrics.items():
+        print(f"  {name}: fit {m['fit_seconds']:.2f}s, peak {m['peak_mb']:.1f} MB, "
+              f"{m['mode']} ({m['fit_rows']:,} rows)")
     print("Metrics:", metrics)
 
     print("Creating plots...")
-    create_plots_and_profiles(rfm_clustered, args.output_dir)
+    with span("plots", len(rfm_clustered)):
+        plots = create_plots_and_profiles(
+            rfm_clustered, args.output_dir, args.plot_mode, args.jobs, args.plot_points
+        )
+    for name, state in plots["figures"].items():
+        print(f"  {name}: {state} ({plots['mode']})")
 
     print("Labeling segments...")
     profile = pd.read_csv(os.path.join(args.output_dir, "cluster_profile.csv"), index_col=0)
@@ -0,0 +1,241 @@
+"""
+Figures of the RFM pipeline: R/F/M boxplots, Frequency vs Monetary by
+cluster, cluster share pie.
+
+Each figure is reduced to a small payload in the parent (exact boxplot
+statistics with thinned fliers, a deterministic per-cluster sample or
+the points for a hexbin) and rendered in its own worker process. A
+figure whose payload hash matches the one recorded in the output
+directory (and whose PNG still exists) is not rendered again.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+
+# "auto" draws every point up to this many customers
+PLOT_FULL_MAX = 50_000
+# points kept in "sample" mode, spread over the clusters
+PLOT_MAX_POINTS = 20_000
+MAX_FLIERS = 1_000
+PLOT_MODES = ("auto", "full", "sample", "hexbin")
+
+MANIFEST = ".plot_inputs.json"
+# bump when the drawing code changes so unchanged inputs re-render once
+FIGURE_VERSION = 1
+
+
+def resolve_plot_mode(mode, n_rows, full_max=PLOT_FULL_MAX):
+    """'auto' -> 'full' up to `full_max` rows, else 'sample'."""
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Unknown plot mode: {mode}")
+    if mode == "auto":
+        return "full" if n_rows <= full_max else "sample"
+    return mode
+
+
+def _pyplot():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+# ============================
+# PAYLOADS (parent, full data)
+# ============================
+def _thin(values, limit):
+    """At most `limit` evenly spaced values of the sorted input (extremes kept)."""
+    values = np.sort(np.asarray(values))
+    if len(values) <= limit:
+        return values
+    return values[np.linspace(0, len(values) - 1, limit).astype("int64")]
+
+
+def _boxplot_payload(rfm, mode):
+    columns = ["Recency", "Frequency", "Monetary"]
+    if mode == "full":
+        return {"columns": {col: rfm[col].dropna().to_numpy() for col in columns}}
+
+    from matplotlib.cbook import boxplot_stats
+
+    stats = {}
+    for col in columns:
+        s = boxplot_stats(rfm[col].dropna().to_numpy())[0]
+        s["fliers"] = _thin(s["fliers"], MAX_FLIERS)
+        stats[col] = s
+    return {"stats": stats}
+
+
+def sample_per_cluster(clusters, max_points, seed=42):
+    """Sorted row positions of a deterministic sample, proportional per cluster."""
+    clusters = np.asarray(clusters)
+    n = len(clusters)
+    if n <= max_points:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    keep = []
+    for c in np.unique(clusters):
+        rows = np.flatnonzero(clusters == c)
+        take = max(1, int(round(len(rows) * max_points / n)))
+        keep.append(rng.choice(rows, size=min(take, len(rows)), replace=False))
+    return np.sort(np.concatenate(keep))
+
+
+def _scatter_payload(rfm, mode, max_points):
+    freq = rfm["Frequency"].to_numpy()
+    mon = rfm["Monetary"].to_numpy()
+    clusters = rfm["Cluster"].to_numpy()
+    if mode == "hexbin":
+        return {"mode": mode, "frequency": freq, "monetary": mon, "total": len(rfm)}
+
+    rows = sample_per_cluster(clusters, max_points) if mode == "sample" else np.arange(len(rfm))
+    return {
+        "mode": mode,
+        "total": len(rfm),
+        "clusters": {
+            int(c): (freq[rows][clusters[rows] == c], mon[rows][clusters[rows] == c])
+            for c in sorted(np.unique(clusters))
+        },
+    }
+
+
+def _pie_payload(rfm):
+    profile = rfm.groupby("Cluster")["CustomerID"].count().rename("Count")
+    profile_ratio = profile / profile.sum() * 100
+    return {"index": profile_ratio.index.to_numpy(), "ratio": profile_ratio.to_numpy()}
+
+
+# ============================
+# RENDERERS (worker processes)
+# ============================
+def _render_boxplots(path, payload):
+    plt = _pyplot()
+    fig = plt.figure(figsize=(15, 5))
+    if "columns" in payload:
+        for i, (col, values) in enumerate(payload["columns"].items(), 1):
+            plt.subplot(1, 3, i)
+            plt.boxplot(values)
+            plt.title(col)
+    else:
+        for i, (col, stats) in enumerate(payload["stats"].items(), 1):
+            ax = plt.subplot(1, 3, i)
+            ax.bxp([stats])
+            plt.title(col)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close(fig)
+
+
+def _render_scatter(path, payload):
+    plt = _pyplot()
+    fig = plt.figure(figsize=(10, 8))
+    title = "Frequency vs Monetary by Cluster"
+    if payload["mode"] == "hexbin":
+        plt.hexbin(payload["frequency"], payload["monetary"], gridsize=80, bins="log", mincnt=1)
+        plt.colorbar(label="Customers (log)")
+        title = f"Frequency vs Monetary density ({payload['total']:,} customers)"
+    else:
+        shown = 0
+        for c, (freq, mon) in payload["clusters"].items():
+            plt.scatter(freq, mon, label=f"Cluster {c}", s=20)
+            shown += len(freq)
+        if payload["mode"] == "sample":
+            title += f" (sample of {shown:,} / {payload['total']:,})"
+        plt.legend()
+    plt.xlabel("Frequency")
+    plt.ylabel("Monetary")
+    plt.title(title)
+    plt.grid(True, linestyle="--", alpha=0.6)
+    plt.savefig(path)
+    plt.close(fig)
+
+
+def _render_pie(path, payload):
+    plt = _pyplot()
+    fig = plt.figure(figsize=(8, 8))
+    plt.pie(payload["ratio"], labels=[f"C{i}" for i in payload["index"]], autopct="%1.1f%%")
+    plt.title("Customer Distribution per Cluster")
+    plt.savefig(path)
+    plt.close(fig)
+
+
+# ============================
+# INPUT HASHES
+# ============================
+def _update_hash(h, value):
+    if isinstance(value, np.ndarray):
+        h.update(f"nd{value.dtype.str}{value.shape}".encode())
+        if value.dtype.kind == "O":
+            h.update(repr(value.tolist()).encode())
+        else:
+            h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for key in sorted(value, key=str):
+            h.update(repr(key).encode())
+            _update_hash(h, value[key])
+        h.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        h.update(b"[")
+        for item in value:
+            _update_hash(h, item)
+        h.update(b"]")
+    else:
+        h.update(repr(value).encode())
+
+
+def payload_hash(name, payload):
+    h = hashlib.sha256(f"{name}:{FIGURE_VERSION}".encode())
+    _update_hash(h, payload)
+    return h.hexdigest()
+
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_figures(rfm, output_dir="./output", mode="auto", jobs=1,
+                   max_points=PLOT_MAX_POINTS, full_max=PLOT_FULL_MAX, force=False):
+    """
+    Render the three figures of a clustered RFM table into `output_dir`
+    on `jobs` worker processes (-1 = all cores), skipping unchanged ones.
+
+    Returns {"mode": ..., "figures": {filename: "rendered" | "unchanged"}}.
+    """
+    import joblib
+
+    mode = resolve_plot_mode(mode, len(rfm), full_max)
+    figures = {
+        "rfm_boxplots.png": (_render_boxplots, _boxplot_payload(rfm, mode)),
+        "rfm_scatter.png": (_render_scatter, _scatter_payload(rfm, mode, max_points)),
+        "cluster_pie.png": (_render_pie, _pie_payload(rfm)),
+    }
+
+    manifest = _load_manifest(output_dir)
+    status, todo = {}, []
+    for filename, (render, payload) in figures.items():
+        digest = payload_hash(filename, payload)
+        path = os.path.join(output_dir, filename)
+        if not force and manifest.get(filename) == digest and os.path.exists(path):
+            status[filename] = "unchanged"
+            continue
+        todo.append((filename, render, path, payload, digest))
+
+    if todo:
+        joblib.Parallel(n_jobs=min(jobs, len(todo)) if jobs > 0 else jobs)(
+            joblib.delayed(render)(path, payload) for _, render, path, payload, _ in todo
+        )
+        for filename, _, _, _, digest in todo:
+            manifest[filename] = digest
+            status[filename] = "rendered"
+        with open(os.path.join(output_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return {"mode": mode, "figures": {name: status[name] for name in figures}}
@@ -0,0 +1,326 @@
+import os
+import threading
+import pandas as pd
+
+from config import (
+    db_connection, RFM_STREAM_CHUNKSIZE, RFM_STREAM_MIN_MB,
+    RFM_PARALLEL_WORKERS, RFM_PARALLEL_MIN_ROWS
+)
+from rfm_core import (
+    clean_transactions, compute_rfm, cap_and_log_transform,
+    build_cluster_profile, label_segments_auto
+)
+from rfm_stream import compute_rfm_streaming
+from rfm_parallel import compute_rfm_parallel
+from model_registry import registry
+from rfm_writer import write_rfm_results, write_cluster_summary
+from rfm_incremental import apply_delta
+from upload_cache import load_cached, cached_num_rows, iter_cached_chunks
+from xlsx_stream import read_excel_streaming
+from instrumentation import span
+
+STAGES = ["read", "clean", "rfm", "transform", "model", "predict", "save"]
+
+
+class RfmProcessingError(Exception):
+    """Pipeline failure with the HTTP status the route should answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _noop(stage):
+    pass
+
+
+def read_upload(filepath):
+    """Load an uploaded CSV or Excel file, from its columnar cache if built."""
+    df = load_cached(filepath)
+    if df is not None:
+        return df
+    if filepath.endswith(".csv"):
+        return pd.read_csv(filepath)
+    return read_excel_streaming(filepath)
+
+
+def use_streaming(filepath):
+    """Large uploads are aggregated chunk by chunk (see rfm_stream)."""
+    if not filepath.endswith((".csv", ".xlsx")) or RFM_STREAM_CHUNKSIZE <= 0:
+        return False
+    try:
+        size_mb = os.path.getsize(filepath) / (1024 * 1024)
+    except OSError:
+        return False
+    return size_mb >= RFM_STREAM_MIN_MB
+
+
+def use_parallel(filepath):
+    """Large cached uploads are aggregated on several processes (see rfm_parallel)."""
+    if RFM_PARALLEL_WORKERS <= 1:
+        return False
+    rows = cached_num_rows(filepath)
+    return rows is not None and rows >= RFM_PARALLEL_MIN_ROWS
+
+
+def build_rfm(filepath, progress=_noop):
+    """Return the RFM table for an uploaded file."""
+    if use_parallel(filepath):
+        progress("rfm")
+        with span("rfm_parallel") as s:
+            try:
+                rfm, report = compute_rfm_parallel(
+                    filepath, RFM_PARALLEL_WORKERS, return_report=True
+                )
+            except Exception as e:
+                raise RfmProcessingError(f"Failed to read file: {str(e)}", 400)
+            s["rows_in"] = report["rows_in"]
+            s["rows_out"] = len(rfm)
+            s["dropped"] = report["dropped"]
+        return rfm
+
+    if use_streaming(filepath):
+        # read, clean and aggregate in one bounded-memory pass
+        progress("read")
+        with span("read_stream") as s:
+            # record batches of the cache when built, else the raw file
+            chunks = iter_cached_chunks(filepath, RFM_STREAM_CHUNKSIZE)
+            s["source"] = "raw" if chunks is None else "cache"
+            try:
+                rfm = compute_rfm_streaming(filepath, RFM_STREAM_CHUNKSIZE, chunks=chunks)
+            except Exception as e:
+                raise RfmProcessingError(f"Failed to read file: {str(e)}", 400)
+            s["rows_out"] = len(rfm)
+        return rfm
+
+    # 1. Load file (CSV or Excel)
+    progress("read")
+    with span("read") as s:
+        try:
+            df = read_upload(filepath)
+        except Exception as e:
+            raise RfmProcessingError(f"Failed to read file: {str(e)}", 400)
+        s["rows_out"] = len(df)
+
+    # 2. Basic cleaning (drop null CustomerID, numeric fix, etc.)
+    progress("clean")
+    with span("clean", len(df)) as s:
+        df, report = clean_transactions(df)
+        s["rows_out"] = len(df)
+        s["dropped"] = report["dropped"]
+
+    # 3. Compute RFM
+    progress("rfm")
+    with span("rfm", len(df)) as s:
+        rfm = compute_rfm(df)
+        s["rows_out"] = len(rfm)
+    return rfm
+
+
+def get_model_entry():
+    """Current registry entry for the scoring model (model + version)."""
+    try:
+        return registry.get_entry()
+    except Exception as e:
+        raise RfmProcessingError(f"Model load error: {str(e)}", 500)
+
+
+def score_file(filepath, progress=_noop, model=None):
+    """Run read → clean → RFM → transform → predict; return the scored table."""
+    rfm_df = build_rfm(filepath, progress)
+
+    # 4. Transform → cap outliers, log-transform, scale
+    progress("transform")
+    with span("transform", len(rfm_df)) as s:
+        rfm_proc, rfm_log, rfm_scaled_df, scaler = cap_and_log_transform(rfm_df)
+        s["rows_out"] = len(rfm_scaled_df)
+
+    # Ensure required columns exist
+    for col in ["R_log", "F_log", "M_log"]:
+        if col not in rfm_log.columns:
+            raise RfmProcessingError(f"Missing column: {col}", 400)
+
+    # 5. Get trained model (cached per worker, see model_registry)
+    progress("model")
+    if model is None:
+        with span("model"):
+            model = get_model_entry().model
+
+    # 6. Model prediction
+    progress("predict")
+    with span("predict", len(rfm_scaled_df)) as s:
+        try:
+            clusters = model.predict(rfm_scaled_df)
+        except Exception as e:
+            raise RfmProcessingError(f"Prediction failed: {str(e)}", 400)
+        s["rows_out"] = len(clusters)
+
+    rfm_proc["cluster"] = clusters
+    return rfm_proc
+
+
+# ============================
+# RESULT REUSE (same content + model)
+# ============================
+# updated from request threads; jobs report theirs back (see jobs._finish)
+reuse_stats = {"hits": 0, "misses": 0}
+_reuse_lock = threading.Lock()
+
+
+def count_reuse(hits=0, misses=0):
+    with _reuse_lock:
+        reuse_stats["hits"] += hits
+        reuse_stats["misses"] += misses
+
+
+def reuse_stats_snapshot():
+    with _reuse_lock:
+        return dict(reuse_stats)
+
+
+def find_previous_run(conn, content_hash, model_version):
+    """Latest run scored from the same file content with the same model."""
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT file_id, total_customers, clusters
+        FROM rfm_runs
+        WHERE content_hash=%s AND model_version=%s
+        ORDER BY id DESC
+        LIMIT 1
+    """, (content_hash, model_version))
+    run = cur.fetchone()
+    cur.close()
+    return run
+
+
+def copy_results(conn, source_file_id, file_id):
+    """Replace the rfm_results rows of a file with those of another file."""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM rfm_results WHERE file_id=%s", (file_id,))
+    cur.execute("""
+        INSERT INTO rfm_results (file_id, customer_id, recency, frequency, monetary, cluster)
+        SELECT %s, customer_id, recency, frequency, monetary, cluster
+        FROM rfm_results
+        WHERE file_id=%s
+        ORDER BY id
+    """, (file_id, source_file_id))
+    copied = cur.rowcount
+
+    cur.execute("DELETE FROM rfm_cluster_summary WHERE file_id=%s", (file_id,))
+    cur.execute("""
+        INSERT INTO rfm_cluster_summary (file_id, cluster, recency_mean, frequency_mean,
+                                         monetary_mean, customer_count, percentage, segment)
+        SELECT %s, cluster, recency_mean, frequency_mean,
+               monetary_mean, customer_count, percentage, segment
+        FROM rfm_cluster_summary
+        WHERE file_id=%s
+    """, (file_id, source_file_id))
+    cur.close()
+    return copied
+
+
+def record_run(conn, file_id, content_hash, model_version, result):
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO rfm_runs (file_id, content_hash, model_version, total_customers, clusters)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (file_id, content_hash, model_version, result["total_customers"], result["clusters"]))
+    conn.commit()
+    cur.close()
+
+
+def reuse_previous_run(file_id, content_hash, model_version):
+    """Serve results from an earlier identical run; None on a cache miss."""
+    with db_connection() as conn:
+        run = find_previous_run(conn, content_hash, model_version)
+        if run is None:
+            count_reuse(misses=1)
+            return None
+
+        if run["file_id"] != file_id:
+            copy_results(conn, run["file_id"], file_id)
+            result = {"total_customers": run["total_customers"], "clusters": run["clusters"]}
+            record_run(conn, file_id, content_hash, model_version, result)
+
+    count_reuse(hits=1)
+    return {
+        "total_customers": run["total_customers"],
+        "clusters": run["clusters"],
+        "reused_from": run["file_id"]
+    }
+
+
+# ============================
+# PROCESS
+# ============================
+def process_file(file_id, filepath, progress=_noop, content_hash=None):
+    """
+    Score an uploaded file and store the results in rfm_results.
+
+    When `content_hash` is known and the same content was already scored
+    with the current model, the stored rows are reused instead.
+    """
+    with span("model"):
+        entry = get_model_entry()
+
+    if content_hash:
+        with span("reuse") as s:
+            try:
+                reused = reuse_previous_run(file_id, content_hash, entry.model_version)
+            except Exception as e:
+                raise RfmProcessingError(f"Failed to reuse results: {str(e)}", 500)
+            s["rows_out"] = reused["total_customers"] if reused else 0
+        if reused is not None:
+            return {**reused, "model_version": entry.model_version}
+
+    rfm_proc = score_file(filepath, progress, entry.model)
+
+    # 7. Save results to DB (batched, see rfm_writer)
+    progress("save")
+    with span("save", len(rfm_proc)) as s:
+        try:
+            with db_connection() as conn:
+                write_stats = write_rfm_results(conn, file_id, rfm_proc)
+                profile = label_segments_auto(build_cluster_profile(rfm_proc, "cluster"))
+                write_cluster_summary(conn, file_id, profile)
+                result = {
+                    "total_customers": write_stats["rows"],
+                    "clusters": int(rfm_proc["cluster"].nunique())
+                }
+                record_run(conn, file_id, content_hash, entry.model_version, result)
+        except Exception as e:
+            raise RfmProcessingError(f"Failed to save results: {str(e)}", 500)
+        s["rows_out"] = write_stats["rows"]
+
+    return {
+        **result,
+        "insert_rows_per_sec": write_stats["rows_per_sec"],
+        "model_version": entry.model_version
+    }
+
+
+# ============================
+# INCREMENTAL (delta uploads)
+# ============================
+def process_delta(user_id, file_id, filepath, progress=_noop, rebuild=False, content_hash=None):
+    """
+    Fold an upload of new transactions into the user's customer state and
+    rescore only the customers it touches (see rfm_incremental). An upload
+    that was already applied is skipped.
+    """
+    entry = get_model_entry()
+
+    progress("read")
+    try:
+        with db_connection() as conn:
+            result = apply_delta(
+                conn, user_id, file_id, filepath,
+                entry.model, entry.model_version, rebuild, content_hash
+            )
+    except (ValueError, KeyError) as e:
+        raise RfmProcessingError(f"Failed to process delta: {str(e)}", 400)
+    except Exception as e:
+        raise RfmProcessingError(f"Failed to update customer state: {str(e)}", 500)
+
+    return {**result, "model_version": entry.model_version}
@@ -0,0 +1,217 @@
+import os
+import shutil
+import weakref
+import tempfile
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+from rfm_core import basic_cleaning, RFM_INPUT_COLUMNS
+from xlsx_stream import iter_excel_chunks
+
+
+SPILL_PARTITIONS = 8
+
+
+class RfmAccumulator:
+    """
+    Running per-customer RFM state built from cleaned transaction chunks:
+    last invoice date, distinct (customer, invoice) pairs and the
+    (customer, Amount) rows, spilled to a temporary directory.
+
+    Memory grows with customers and distinct invoices, not with line items.
+    Accumulators can be merged, so chunks may come from different readers.
+
+    Monetary is summed once from the spilled rows, not from per-chunk
+    partial sums: pandas' grouped sum is compensated (see rfm_parallel),
+    so only the same rows in the same order match compute_rfm bit for
+    bit. Rows are hash-partitioned by customer and summed one partition
+    at a time.
+    """
+
+    def __init__(self, partitions=SPILL_PARTITIONS):
+        self.last_date = pd.Series(dtype="datetime64[ns]")
+        self._pairs = []          # deduplicated (CustomerID, InvoiceNo) frames
+        self._pairs_rows = 0
+        self._compacted_rows = 0
+        self._id_kinds = set()
+        self._partitions = partitions
+        self._spills = []         # one file per partition, created on first rows
+        self._finalizer = None
+        self.rows = 0
+
+    def update(self, df):
+        """Fold one cleaned chunk (basic_cleaning output) into the state."""
+        if df.empty:
+            return self
+        self.rows += len(df)
+        self._id_kinds.add(df["CustomerID"].dtype.kind)
+
+        grouped = df.groupby("CustomerID")
+        self.last_date = _combine(self.last_date, grouped["InvoiceDate"].max(), "max")
+        self._spill(df["CustomerID"].to_numpy(), df["Amount"].to_numpy())
+
+        pairs = df[["CustomerID", "InvoiceNo"]].drop_duplicates()
+        self._add_pairs(pairs)
+        return self
+
+    def merge(self, other):
+        """Fold another accumulator into this one."""
+        self.rows += other.rows
+        self._id_kinds |= other._id_kinds
+        self.last_date = _combine(self.last_date, other.last_date, "max")
+        # other's rows come after ours, as if its chunks were read next
+        for p in range(len(other._spills)):
+            for keys, amounts in other._spilled(p):
+                self._spill(keys, amounts)
+        for pairs in other._pairs:
+            self._add_pairs(pairs)
+        return self
+
+    def _spill(self, keys, amounts):
+        if not self._spills:
+            folder = tempfile.mkdtemp(prefix="rfm_stream_")
+            self._spills = [
+                open(os.path.join(folder, f"{p:04d}.npy"), "w+b") for p in range(self._partitions)
+            ]
+            self._finalizer = weakref.finalize(self, _remove_spills, self._spills, folder)
+        bucket = pd.util.hash_array(_hash_keys(keys)) % self._partitions
+        for p in np.unique(bucket):
+            rows = bucket == p
+            np.save(self._spills[p], keys[rows])
+            np.save(self._spills[p], amounts[rows])
+
+    def _spilled(self, p):
+        """(keys, amounts) pairs of partition `p`, in the order they were spilled."""
+        f = self._spills[p]
+        end = f.tell()
+        f.seek(0)
+        pieces = []
+        while f.tell() < end:
+            pieces.append((np.load(f, allow_pickle=True), np.load(f, allow_pickle=True)))
+        f.seek(end)
+        return pieces
+
+    @property
+    def amount(self):
+        """Summed Amount per customer, one partition of spilled rows at a time."""
+        sums = []
+        for p in range(len(self._spills)):
+            pieces = self._spilled(p)
+            if not pieces:
+                continue
+            keys = np.concatenate([k for k, _ in pieces])
+            amounts = np.concatenate([a for _, a in pieces])
+            sums.append(pd.Series(amounts).groupby(keys).sum())
+        if not sums:
+            return pd.Series(dtype="float64")
+        amount = pd.concat(sums)
+        if not amount.index.is_unique:
+            # one customer read as different types in different chunks (1 vs "1")
+            amount = amount.groupby(level=0).sum()
+        return amount
+
+    def close(self):
+        """Remove the spilled rows; the accumulator is unusable afterwards."""
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def _add_pairs(self, pairs):
+        self._pairs.append(pairs)
+        self._pairs_rows += len(pairs)
+        # compact once the pending duplicates outweigh the compacted set
+        if self._pairs_rows > 2 * max(self._compacted_rows, 100_000):
+            self._compact()
+
+    def _compact(self):
+        if len(self._pairs) > 1:
+            self._pairs = [pd.concat(self._pairs, ignore_index=True).drop_duplicates()]
+        self._pairs_rows = self._compacted_rows = sum(len(p) for p in self._pairs)
+
+    def max_date(self):
+        return self.last_date.max()
+
+    def frequency(self):
+        """Distinct invoices per customer."""
+        self._compact()
+        if self._pairs:
+            return self._pairs[0].groupby("CustomerID").size()
+        return pd.Series(dtype="int64")
+
+    def result(self, reference_date=None):
+        """Return the RFM table in the same shape as compute_rfm."""
+        if reference_date is None:
+            reference_date = self.max_date() + dt.timedelta(days=1)
+
+        rfm = pd.DataFrame({
+            "Recency": (reference_date - self.last_date).dt.days,
+            "Frequency": self.frequency(),
+            "Monetary": self.amount,
+        }).sort_index()
+        rfm.index = rfm.index.astype(self._id_dtype())
+        rfm.index.name = "CustomerID"
+        rfm = rfm.reset_index()
+        rfm["Recency"] = rfm["Recency"].astype("int64")
+        rfm["Frequency"] = rfm["Frequency"].astype("int64")
+        return rfm
+
+    def _id_dtype(self):
+        # a column with a missing id anywhere is float64 when read in one go
+        if self._id_kinds and self._id_kinds <= {"i", "u", "f"}:
+            return "float64" if "f" in self._id_kinds else "int64"
+        return object
+
+
+def _hash_keys(keys):
+    # an id hashes the same whether its chunk was read as int or float
+    return keys.astype("float64") if keys.dtype.kind in "iu" else keys
+
+
+def _remove_spills(files, folder):
+    for f in files:
+        f.close()
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def _combine(left, right, how):
+    if left.empty:
+        return right
+    if right.empty:
+        return left
+    both = pd.concat([left, right])
+    grouped = both.groupby(level=0)
+    return grouped.max() if how == "max" else grouped.sum()
+
+
+def iter_csv_chunks(path, chunksize=100_000):
+    """Read only the RFM columns of a CSV file, `chunksize` rows at a time."""
+    return pd.read_csv(
+        path,
+        usecols=RFM_INPUT_COLUMNS,
+        dtype={"InvoiceNo": str},
+        chunksize=chunksize
+    )
+
+
+def iter_chunks(path, chunksize=100_000):
+    """RFM-column chunks from a CSV or .xlsx file."""
+    if path.lower().endswith(".xlsx"):
+        return iter_excel_chunks(path, usecols=RFM_INPUT_COLUMNS, chunksize=chunksize)
+    return iter_csv_chunks(path, chunksize)
+
+
+def compute_rfm_streaming(path, chunksize=100_000, reference_date=None, chunks=None):
+    """
+    Same RFM table as basic_cleaning + compute_rfm on the full file, but
+    built chunk by chunk so the transaction table is never fully in memory.
+    `chunks` replaces the raw file reader (e.g. upload_cache.iter_cached_chunks).
+    """
+    if chunks is None:
+        chunks = iter_chunks(path, chunksize)
+    acc = RfmAccumulator()
+    try:
+        for chunk in chunks:
+            acc.update(basic_cleaning(chunk))
+        return acc.result(reference_date)
+    finally:
+        acc.close()
@@ -1,13 +1,15 @@
 import os
 import joblib
 import pandas as pd
-from rfm_pipeline import basic_cleaning, compute_rfm, cap_and_log_transform
+from rfm_core import clean_transactions, compute_rfm, cap_and_log_transform
+from xlsx_stream import read_excel_streaming
 
 from config import MODEL_PATH
 
 def load_file_to_df(path):
-    path = path
-    if path.lower().endswith(".xlsx") or path.lower().endswith(".xls"):
+    if path.lower().endswith(".xlsx"):
+        df = read_excel_streaming(path)
+    elif path.lower().endswith(".xls"):
         df = pd.read_excel(path)
     elif path.lower().endswith(".csv"):
         df = pd.read_csv(path)
@@ -18,14 +20,8 @@ def load_file_to_df(path):
 def process_and_predict(file_path, model):
     df = pd.read_csv(file_path)
 
-    # CLEANING
-    df = df.dropna(subset=["CustomerID"])
-    df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce")
-    df["UnitPrice"] = pd.to_numeric(df["UnitPrice"], errors="coerce")
-    df = df.dropna(subset=["Quantity", "UnitPrice"])
-    df = df[df["Quantity"] > 0]
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], errors="coerce")
-    df = df.dropna(subset=["InvoiceDate"])
+    # CLEANING (shared single-pass engine, see rfm_core.clean_transactions)
+    df, _ = clean_transactions(df)
 
     # Compute RFM table
     rfm_table = compute_rfm(df)
@@ -0,0 +1,187 @@
+import os
+import time
+import tempfile
+import pandas as pd
+
+from config import RFM_INSERT_BATCH_SIZE, RFM_INSERT_COMMIT_EVERY, RFM_INSERT_METHOD
+
+RESULT_COLUMNS = ["file_id", "customer_id", "recency", "frequency", "monetary", "cluster"]
+
+
+# ============================
+# CUSTOMER ID NORMALIZATION
+# ============================
+def normalize_customer_ids(ids):
+    """
+    Vectorized customer id cleanup: integer-like numbers (12345.0) become
+    "12345", everything else (strings, NaN) keeps its string form.
+    """
+    ids = pd.Series(ids)
+    if ids.dtype == object:
+        numeric = ids.where(ids.map(type) != str)
+    else:
+        numeric = ids
+    as_num = pd.to_numeric(numeric, errors="coerce")
+    is_int = as_num.notna() & (as_num % 1 == 0)
+
+    out = ids.astype(str)
+    out[is_int] = as_num[is_int].astype("int64").astype(str)
+    return out
+
+
+def build_result_frame(file_id, rfm_proc, cluster_col="cluster"):
+    """Return the rfm_results rows for a scored RFM table, in column order."""
+    if "CustomerID" in rfm_proc.columns:
+        customer_ids = normalize_customer_ids(rfm_proc["CustomerID"].values)
+    else:
+        customer_ids = normalize_customer_ids(rfm_proc.index.values)
+
+    return pd.DataFrame({
+        "file_id": int(file_id),
+        "customer_id": customer_ids.values,
+        "recency": rfm_proc["Recency"].astype("int64").values,
+        "frequency": rfm_proc["Frequency"].astype("int64").values,
+        "monetary": rfm_proc["Monetary"].astype("float64").values,
+        "cluster": rfm_proc[cluster_col].astype("int64").values,
+    })
+
+
+# ============================
+# BULK WRITER
+# ============================
+def _placeholder(conn):
+    # sqlite3 (used as a local stand-in) uses qmark params, MySQL uses %s
+    return "?" if type(conn).__module__.startswith("sqlite3") else "%s"
+
+
+def _insert_batches(conn, cur, rows, batch_size, commit_every):
+    ph = _placeholder(conn)
+    row_sql = "(" + ", ".join([ph] * len(RESULT_COLUMNS)) + ")"
+    head = f"INSERT INTO rfm_results ({', '.join(RESULT_COLUMNS)}) VALUES "
+
+    batches = 0
+    since_commit = 0
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        params = [v for row in chunk for v in row]
+        cur.execute(head + ", ".join([row_sql] * len(chunk)), params)
+        batches += 1
+        since_commit += len(chunk)
+        if commit_every and since_commit >= commit_every:
+            conn.commit()
+            since_commit = 0
+    return batches
+
+
+def _load_data_batches(conn, cur, frame, batch_size, commit_every):
+    batches = 0
+    since_commit = 0
+    for start in range(0, len(frame), batch_size):
+        chunk = frame.iloc[start:start + batch_size]
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                chunk.to_csv(f, index=False, header=False, lineterminator="\n")
+            cur.execute(f"""
+                LOAD DATA LOCAL INFILE '{path}'
+                INTO TABLE rfm_results
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+                LINES TERMINATED BY '\\n'
+                ({', '.join(RESULT_COLUMNS)})
+            """)
+        finally:
+            os.remove(path)
+        batches += 1
+        since_commit += len(chunk)
+        if commit_every and since_commit >= commit_every:
+            conn.commit()
+            since_commit = 0
+    return batches
+
+
+def write_rfm_results(conn, file_id, rfm_proc, batch_size=None, commit_every=None, method=None):
+    """
+    Replace the rfm_results rows of a file with a scored RFM table.
+
+    Earlier rows of `file_id` (a rescore after a model change, a reused
+    run copied in before) are deleted in the same transaction.
+
+    method="insert" sends multi-row INSERT statements of `batch_size` rows;
+    method="load_data" streams each batch through LOAD DATA LOCAL INFILE
+    (the connection must allow local infile). A commit is issued every
+    `commit_every` rows (0 = only at the end).
+    """
+    batch_size = batch_size or RFM_INSERT_BATCH_SIZE
+    commit_every = RFM_INSERT_COMMIT_EVERY if commit_every is None else commit_every
+    method = method or RFM_INSERT_METHOD
+
+    start = time.perf_counter()
+    frame = build_result_frame(file_id, rfm_proc)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DELETE FROM rfm_results WHERE file_id={_placeholder(conn)}", (int(file_id),))
+        if method == "load_data":
+            batches = _load_data_batches(conn, cur, frame, batch_size, commit_every)
+        elif method == "insert":
+            rows = list(frame.itertuples(index=False, name=None))
+            batches = _insert_batches(conn, cur, rows, batch_size, commit_every)
+        else:
+            raise ValueError(f"Unknown insert method: {method}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": len(frame),
+        "batches": batches,
+        "method": method,
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(len(frame) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+# ============================
+# CLUSTER SUMMARY
+# ============================
+def write_cluster_summary(conn, file_id, profile):
+    """
+    Replace the rfm_cluster_summary rows of a file with a labeled cluster
+    profile (build_cluster_profile + label_segments_auto output).
+    """
+    ph = _placeholder(conn)
+    rows = [
+        (
+            int(file_id),
+            int(cluster),
+            float(p["Recency"]),
+            float(p["Frequency"]),
+            float(p["Monetary"]),
+            int(p["Count"]),
+            float(p["Percentage"]),
+            None if pd.isna(p.get("Segment")) else p.get("Segment"),
+        )
+        for cluster, p in profile.iterrows()
+    ]
+
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DELETE FROM rfm_cluster_summary WHERE file_id={ph}", (int(file_id),))
+        if rows:
+            cur.execute(
+                "INSERT INTO rfm_cluster_summary (file_id, cluster, recency_mean, frequency_mean, "
+                "monetary_mean, customer_count, percentage, segment) VALUES "
+                + ", ".join(["(" + ", ".join([ph] * 8) + ")"] * len(rows)),
+                [v for row in rows for v in row]
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return len(rows)
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
-from config import get_db_connection, SECRET_KEY
-import bcrypt
+from config import db_connection, SECRET_KEY
+from password_hasher import password_hasher, HasherBusy
 import jwt
 import datetime
 
@@ -16,25 +16,26 @@ def register():
     if not username or not email or not password:
         return jsonify({"message": "username, email, and password required"}), 400
 
-    # hash password
-    salt = bcrypt.gensalt()
-    pw_hash = bcrypt.hashpw(password.encode(), salt)
-
-    conn = get_db_connection()
-    cur = conn.cursor()
+    # hash password (bounded pool, see password_hasher)
     try:
-        cur.execute("""
-            INSERT INTO users (username, email, password_hash)
-            VALUES (%s, %s, %s)
-        """, (username, email, pw_hash))
-        conn.commit()
-        user_id = cur.lastrowid
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"message": "username or email already exists", "error": str(e)}), 400
-    finally:
-        cur.close()
-        conn.close()
+        pw_hash = password_hasher.hash(password)
+    except HasherBusy as e:
+        return jsonify({"message": str(e)}), 503
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO users (username, email, password_hash)
+                VALUES (%s, %s, %s)
+            """, (username, email, pw_hash))
+            conn.commit()
+            user_id = cur.lastrowid
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"message": "username or email already exists", "error": str(e)}), 400
+        finally:
+            cur.close()
 
     payload = {
         "user_id": user_id,
@@ -58,28 +59,29 @@ def login():
     if not identifier or not password:
         return jsonify({"message": "identifier and password required"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-
-    # Cek apakah identifier cocok ke username atau email
-    cur.execute("""
-        SELECT id, username, email, password_hash 
-        FROM users 
-        WHERE username = %s OR email = %s
-        LIMIT 1
-    """, (identifier, identifier))
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
 
-    user = cur.fetchone()
+        # Cek apakah identifier cocok ke username atau email
+        cur.execute("""
+            SELECT id, username, email, password_hash 
+            FROM users 
+            WHERE username = %s OR email = %s
+            LIMIT 1
+        """, (identifier, identifier))
 
-    cur.close()
-    conn.close()
+        user = cur.fetchone()
+        cur.close()
 
     if not user:
         return jsonify({"message": "invalid credentials"}), 401
 
-    stored_hash = bytes(user["password_hash"])
+    try:
+        valid = password_hasher.check(password, user["password_hash"])
+    except HasherBusy as e:
+        return jsonify({"message": str(e)}), 503
 
-    if not bcrypt.checkpw(password.encode(), stored_hash):
+    if not valid:
         return jsonify({"message": "invalid credentials"}), 401
 
     payload = {
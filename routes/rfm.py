@@ -1,144 +1,260 @@
 print(">>> RFM ROUTES LOADED <<<")
 import os
-import pandas as pd
-import joblib
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from middlewares.auth_middleware import auth_required
-from config import get_db_connection
-from rfm_pipeline import basic_cleaning, compute_rfm, cap_and_log_transform
+from config import db_connection, RFM_ASYNC_DEFAULT
+from instrumentation import trace, span
+from model_registry import registry
+from rfm_service import RfmProcessingError, process_file, process_delta, reuse_stats_snapshot
+from jobs import job_manager, JobQueueFull, JobSubmitError
+from results_query import (
+    DEFAULT_LIMIT, EXPORT_BATCH_ROWS, FORMATS, BINARY_FORMATS, QueryError,
+    parse_options, negotiate_format, build_query, encode_cursor, project,
+    iter_batches, ndjson_chunks, csv_chunks, arrow_chunks, parquet_chunks
+)
 
 rfm_bp = Blueprint("rfm", __name__)
 
-MODEL_PATH = os.getenv("MODEL_PATH")
 UPLOAD_DIR = os.getenv("UPLOAD_DIR")
 
 @rfm_bp.post("/process/<int:file_id>")
 @auth_required
 def process_rfm(file_id):
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
+    # stage spans of this request → /metrics + one JSON log line
+    with trace("process_rfm", file_id=file_id, user_id=request.user["id"]) as t:
+        return _process_rfm(t, file_id)
 
-    # 1. Check file belongs to user
-    cur.execute("""
-        SELECT filename FROM upload_history
-        WHERE id=%s AND user_id=%s
-    """, (file_id, request.user["id"]))
 
-    history = cur.fetchone()
+def _process_rfm(t, file_id):
+    # 1. Check file belongs to user (connection goes back to the pool
+    #    before the heavy processing starts)
+    with span("lookup"):
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute("""
+                SELECT filename, content_hash FROM upload_history
+                WHERE id=%s AND user_id=%s
+            """, (file_id, request.user["id"]))
+            history = cur.fetchone()
+            cur.close()
 
     if not history:
+        t.status = "not_found"
         return jsonify({"message": "file not found or unauthorized"}), 404
 
     filepath = os.path.join(UPLOAD_DIR, history["filename"])
 
-    # 2. Load file (CSV or Excel)
+    # 2a. Async mode: queue the job and return its id right away
+    run_async = request.args.get("async")
+    run_async = RFM_ASYNC_DEFAULT if run_async is None else run_async.lower() in ("1", "true")
+    if run_async:
+        try:
+            with span("enqueue"):
+                job_id = job_manager.submit(
+                    request.user["id"], file_id, filepath, history["content_hash"]
+                )
+        except JobQueueFull as e:
+            t.status = "rejected"
+            return jsonify({"message": str(e)}), 503
+        except JobSubmitError as e:
+            t.status = "error"
+            t.fields["error"] = str(e)
+            return jsonify({"message": str(e)}), 503
+        t.fields["job_id"] = job_id
+        return jsonify({
+            "message": "RFM processing queued",
+            "job_id": job_id,
+            "status_url": f"/api/rfm/jobs/{job_id}"
+        }), 202
+
+    # 2b. Sync mode: read, clean, RFM, transform, predict, save
     try:
-        if filepath.endswith(".csv"):
-            df = pd.read_csv(filepath)
-        else:
-            df = pd.read_excel(filepath)
-    except Exception as e:
-        return jsonify({"error": f"Failed to read file: {str(e)}"}), 400
+        result = process_file(file_id, filepath, content_hash=history["content_hash"])
+    except RfmProcessingError as e:
+        t.status = "error"
+        t.fields["error"] = e.message
+        return jsonify({"error": e.message}), e.status
 
-    # 3. Basic cleaning (drop null CustomerID, numeric fix, etc.)
-    df = basic_cleaning(df)
+    return jsonify({"message": "RFM processing complete", **result}), 200
 
-    # 4. Compute RFM
-    rfm_df = compute_rfm(df)
 
-    # 5. Transform → cap outliers, log-transform, scale
-    rfm_proc, rfm_log, rfm_scaled_df, scaler = cap_and_log_transform(rfm_df)
+@rfm_bp.post("/incremental/<int:file_id>")
+@auth_required
+def process_rfm_delta(file_id):
+    # The upload holds only new transactions; customer state is per user
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT filename, content_hash FROM upload_history
+            WHERE id=%s AND user_id=%s
+        """, (file_id, request.user["id"]))
+        history = cur.fetchone()
+        cur.close()
 
-    # Ensure required columns exist
-    required_cols = ["R_log", "F_log", "M_log"]
-    for col in required_cols:
-        if col not in rfm_log.columns:
-            return jsonify({"error": f"Missing column: {col}"}), 400
+    if not history:
+        return jsonify({"message": "file not found or unauthorized"}), 404
 
-    # 6. Load trained model
-    try:
-        model = joblib.load(MODEL_PATH)
-    except Exception as e:
-        return jsonify({"error": f"Model load error: {str(e)}"}), 500
+    filepath = os.path.join(UPLOAD_DIR, history["filename"])
+    rebuild = request.args.get("rebuild", "").lower() in ("1", "true")
 
-    # 7. Model prediction
     try:
-        clusters = model.predict(rfm_scaled_df)
-    except Exception as e:
-        return jsonify({"error": f"Prediction failed: {str(e)}"}), 400
-
-    rfm_proc["cluster"] = clusters
-
-    # 8. Save results to DB
-    insert_count = 0
-    for _, row in rfm_proc.iterrows():
-        # Ambil CustomerID dari kolom. Jika tidak ada, fallback ke index (defensive).
-        if "CustomerID" in rfm_proc.columns:
-            cust = row["CustomerID"]
-        else:
-            # defensive fallback (jarang terjadi)
-            cust = _
-
-        # Cust bisa berupa float (hasil parsing). Buat string yang bersih:
-        try:
-            # bila integer-like, simpan tanpa .0
-            cust_str = str(int(cust)) if (not pd.isna(cust) and float(cust).is_integer()) else str(cust)
-        except Exception:
-            cust_str = str(cust)
+        result = process_delta(
+            request.user["id"], file_id, filepath,
+            rebuild=rebuild, content_hash=history.get("content_hash")
+        )
+    except RfmProcessingError as e:
+        return jsonify({"error": e.message}), e.status
 
-        cur.execute("""
-            INSERT INTO rfm_results (file_id, customer_id, recency, frequency, monetary, cluster)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            file_id,
-            cust_str,
-            int(row["Recency"]),
-            int(row["Frequency"]),
-            float(row["Monetary"]),
-            int(row["cluster"])
-        ))
-        insert_count += 1
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    if result["already_applied"]:
+        return jsonify({"message": "delta already applied, state unchanged", **result}), 200
+    return jsonify({"message": "RFM state updated", **result}), 200
 
-    return jsonify({
-        "message": "RFM processing complete",
-        "total_customers": insert_count,
-        "clusters": int(rfm_proc["cluster"].nunique())
-    }), 200
 
+@rfm_bp.get("/jobs/<job_id>")
+@auth_required
+def job_status(job_id):
+    job = job_manager.get(job_id, request.user["id"])
+    if not job:
+        return jsonify({"message": "job not found"}), 404
+    return jsonify(job)
 
-@rfm_bp.get("/results/<int:file_id>")
+
+@rfm_bp.get("/jobs")
 @auth_required
-def rfm_results(file_id):
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
+def list_jobs():
+    return jsonify({"jobs": job_manager.list(request.user["id"]), "stats": job_manager.stats()})
 
-    # validate ownership
+
+def _owns_file(conn, file_id, user_id):
+    cur = conn.cursor(dictionary=True)
     cur.execute("""
         SELECT id FROM upload_history
         WHERE id=%s AND user_id=%s
-    """, (file_id, request.user["id"]))
+    """, (file_id, user_id))
+    found = cur.fetchone() is not None
+    cur.close()
+    return found
 
-    if not cur.fetchone():
-        return jsonify({"message": "not found or unauthorized"}), 404
 
-    cur.execute("""
-        SELECT customer_id, recency, frequency, monetary, cluster
-        FROM rfm_results
-        WHERE file_id=%s
-    """, (file_id,))
+@rfm_bp.get("/results/<int:file_id>")
+@auth_required
+def rfm_results(file_id):
+    """
+    Scored customers of a file.
+
+    Without options the whole list is returned as before. Options:
+    limit/after (keyset pages), cluster, sort (id|recency|frequency|monetary),
+    order (asc|desc), fields (projection) and format=ndjson|csv|arrow|parquet
+    to stream every matching row from a server-side cursor. Without
+    `format` the Accept header picks (e.g. application/vnd.apache.arrow.stream).
+    """
+    try:
+        opts = parse_options(request.args)
+        fmt = negotiate_format(request.args, request.accept_mimetypes)
+    except QueryError as e:
+        return jsonify({"message": str(e)}), 400
 
-    results = cur.fetchall()
+    user_id = request.user["id"]
+    with db_connection() as conn:
+        if not _owns_file(conn, file_id, user_id):
+            return jsonify({"message": "not found or unauthorized"}), 404
 
-    cur.close()
-    conn.close()
+    if fmt != "json":
+        return _stream_results(file_id, opts, fmt)
+
+    paginated = opts["limit"] is not None or opts["after"] is not None
+    limit = (opts["limit"] or DEFAULT_LIMIT) if paginated else None
+
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        sql, params = build_query(file_id, opts, limit)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()
+
+    data = [project(r, opts["fields"]) for r in rows]
+    body = {
+        "message": "success",
+        "file_id": file_id,
+        "total": len(data),
+        "data": data
+    }
+    if paginated:
+        body["next_cursor"] = (
+            encode_cursor(rows[-1], opts["sort"]) if len(rows) == limit else None
+        )
+    response = jsonify(body)
+    response.vary.add("Accept")
+    return response
+
+
+DOWNLOAD_EXTENSIONS = {"csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+
+
+def _stream_results(file_id, opts, fmt):
+    binary = fmt in BINARY_FORMATS
+
+    def generate():
+        # the pooled connection is held only while the response streams
+        with db_connection() as conn:
+            # binary formats build typed columns from plain tuples
+            cur = conn.cursor(dictionary=not binary, buffered=False)
+            try:
+                sql, params = build_query(file_id, opts)
+                cur.execute(sql, params)
+                if binary:
+                    batches = iter_batches(cur, EXPORT_BATCH_ROWS)
+                    columns = [d[0] for d in cur.description]
+                    chunks = arrow_chunks if fmt == "arrow" else parquet_chunks
+                    yield from chunks(batches, columns, opts["fields"])
+                elif fmt == "csv":
+                    yield from csv_chunks(iter_batches(cur), opts["fields"])
+                else:
+                    yield from ndjson_chunks(iter_batches(cur), opts["fields"])
+            finally:
+                cur.close()
+
+    headers = {"Vary": "Accept"}
+    if fmt in DOWNLOAD_EXTENSIONS:
+        headers["Content-Disposition"] = (
+            f"attachment; filename=rfm_results_{file_id}.{DOWNLOAD_EXTENSIONS[fmt]}"
+        )
+    return Response(generate(), mimetype=FORMATS[fmt], headers=headers)
+
+
+@rfm_bp.get("/summary/<int:file_id>")
+@auth_required
+def rfm_summary(file_id):
+    with db_connection() as conn:
+        if not _owns_file(conn, file_id, request.user["id"]):
+            return jsonify({"message": "not found or unauthorized"}), 404
+
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT cluster, recency_mean, frequency_mean, monetary_mean,
+                   customer_count, percentage, segment
+            FROM rfm_cluster_summary
+            WHERE file_id=%s
+            ORDER BY cluster
+        """, (file_id,))
+        clusters = cur.fetchall()
+        cur.close()
 
     return jsonify({
         "message": "success",
         "file_id": file_id,
-        "total": len(results),
-        "data": results
+        "total_customers": sum(c["customer_count"] for c in clusters),
+        "clusters": clusters
     })
+
+
+@rfm_bp.get("/models")
+@auth_required
+def model_stats():
+    return jsonify(registry.stats())
+
+
+@rfm_bp.get("/reuse")
+@auth_required
+def result_reuse_stats():
+    return jsonify(reuse_stats_snapshot())
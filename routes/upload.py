@@ -1,8 +1,12 @@
 import os
+import uuid
+import hashlib
 from flask import Blueprint, request, jsonify
 from middlewares.auth_middleware import auth_required
 from werkzeug.utils import secure_filename
-from config  import get_db_connection
+from config  import db_connection, RFM_STREAM_CHUNKSIZE
+from upload_cache import build_cache_async
+from rfm_service import use_streaming
 
 upload_bp = Blueprint("upload", __name__)
 
@@ -20,47 +24,64 @@ def upload_file():
     if not file.filename.endswith((".csv", ".xlsx")):
         return jsonify({"message": "file must be CSV or XLSX"}), 400
 
-    filename = secure_filename(file.filename)
+    # hash while streaming to disk, used to reuse results of identical uploads
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp_path, "wb") as out:
+            for block in iter(lambda: file.stream.read(1 << 20), b""):
+                digest.update(block)
+                out.write(block)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    content_hash = digest.hexdigest()
+
+    # stored under its hash: a later upload with the same name never
+    # changes the bytes behind this row's content_hash
+    filename = f"{content_hash}_{secure_filename(file.filename)}"
     save_path = os.path.join(UPLOAD_DIR, filename)
-    file.save(save_path)
+    os.replace(tmp_path, save_path)
+
+    # convert to the columnar cache in the background (see upload_cache),
+    # chunk by chunk for files large enough to be streamed
+    build_cache_async(save_path, RFM_STREAM_CHUNKSIZE if use_streaming(save_path) else None)
 
     # simpan ke upload_history
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    cur.execute("""
-        INSERT INTO upload_history (user_id, filename)
-        VALUES (%s, %s)
-    """, (request.user["id"], filename))
+        cur.execute("""
+            INSERT INTO upload_history (user_id, filename, content_hash)
+            VALUES (%s, %s, %s)
+        """, (request.user["id"], filename, content_hash))
 
-    conn.commit()
+        conn.commit()
 
-    upload_id = cur.lastrowid
-    cur.close()
-    conn.close()
+        upload_id = cur.lastrowid
+        cur.close()
 
     return jsonify({
         "message": "file uploaded",
         "upload_id": upload_id,
-        "filename": filename
+        "filename": filename,
+        "content_hash": content_hash
     }), 201
 
 @upload_bp.get("/history")
 @auth_required
 def upload_history():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-
-    cur.execute("""
-        SELECT id, filename, uploaded_at
-        FROM upload_history
-        WHERE user_id=%s
-        ORDER BY uploaded_at DESC
-    """, (request.user["id"],))
-
-    data = cur.fetchall()
-
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+
+        cur.execute("""
+            SELECT id, filename, uploaded_at
+            FROM upload_history
+            WHERE user_id=%s
+            ORDER BY uploaded_at DESC
+        """, (request.user["id"],))
+
+        data = cur.fetchall()
+        cur.close()
 
     return jsonify(data)
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from middlewares.auth_middleware import auth_required
-from config import get_db_connection
-import bcrypt
+from config import db_connection
+from password_hasher import password_hasher, HasherBusy
 
 user_bp = Blueprint("user", __name__)
 
@@ -14,18 +14,17 @@ user_bp = Blueprint("user", __name__)
 def get_profile():
     user_id = request.user["id"]
 
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
 
-    cur.execute("""
-        SELECT id, username, email, created_at
-        FROM users
-        WHERE id = %s
-    """, (user_id,))
+        cur.execute("""
+            SELECT id, username, email, created_at
+            FROM users
+            WHERE id = %s
+        """, (user_id,))
 
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+        user = cur.fetchone()
+        cur.close()
 
     if not user:
         return jsonify({"message": "User not found"}), 404
@@ -48,26 +47,25 @@ def update_profile():
     if not username or not email:
         return jsonify({"message": "username and email are required"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            UPDATE users
-            SET username=%s, email=%s
-            WHERE id=%s
-        """, (username, email, user_id))
-
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        return jsonify({
-            "message": "username or email already exists",
-            "error": str(e)
-        }), 400
-    finally:
-        cur.close()
-        conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        try:
+            cur.execute("""
+                UPDATE users
+                SET username=%s, email=%s
+                WHERE id=%s
+            """, (username, email, user_id))
+
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return jsonify({
+                "message": "username or email already exists",
+                "error": str(e)
+            }), 400
+        finally:
+            cur.close()
 
     return jsonify({"message": "profile updated"}), 200
 
@@ -87,32 +85,37 @@ def update_password():
     if not old_password or not new_password:
         return jsonify({"message": "old_password and new_password required"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-
-    # ambil current hash
-    cur.execute("SELECT password_hash FROM users WHERE id=%s", (user_id,))
-    user = cur.fetchone()
+    # ambil current hash; the connection goes back to the pool before bcrypt runs
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT password_hash FROM users WHERE id=%s", (user_id,))
+        user = cur.fetchone()
+        cur.close()
 
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    stored_hash = bytes(user["password_hash"])
-
-    # verify old password
-    if not bcrypt.checkpw(old_password.encode(), stored_hash):
-        return jsonify({"message": "old password is incorrect"}), 400
-
-    # hash new password
-    salt = bcrypt.gensalt()
-    new_hash = bcrypt.hashpw(new_password.encode(), salt)
-
-    # update
-    cur.execute("UPDATE users SET password_hash=%s WHERE id=%s", (new_hash, user_id))
-    conn.commit()
+    # verify old password, hash new password (bounded pool)
+    try:
+        if not password_hasher.check(old_password, user["password_hash"]):
+            return jsonify({"message": "old password is incorrect"}), 400
+        new_hash = password_hasher.hash(new_password)
+    except HasherBusy as e:
+        return jsonify({"message": str(e)}), 503
+
+    # update, only if the hash we verified against is still current
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE users SET password_hash=%s WHERE id=%s AND password_hash=%s",
+            (new_hash, user_id, user["password_hash"])
+        )
+        updated = cur.rowcount
+        conn.commit()
+        cur.close()
 
-    cur.close()
-    conn.close()
+    if not updated:
+        return jsonify({"message": "password was changed by another request, try again"}), 409
 
     return jsonify({"message": "password updated"}), 200
 
@@ -125,14 +128,13 @@ def update_password():
 def delete_account():
     user_id = request.user["id"]
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    # delete user – rfm_results & upload_history punya FK CASCADE
-    cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
-    conn.commit()
+        # delete user – rfm_results & upload_history punya FK CASCADE
+        cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+        conn.commit()
 
-    cur.close()
-    conn.close()
+        cur.close()
 
     return jsonify({"message": "account deleted"}), 200
@@ -0,0 +1,116 @@
+"""
+Sample-and-assign versions of AgglomerativeClustering and DBSCAN.
+
+Both models are quadratic in the number of customers (Ward linkage keeps
+a pairwise distance matrix, DBSCAN materializes every eps-neighborhood),
+so above a size threshold they are fitted on a stratified sample and the
+remaining customers are assigned afterwards:
+
+- Agglomerative: nearest centroid of the sample clusters
+- DBSCAN: label of the nearest core sample within eps, else noise (-1)
+
+Sample customers keep the label they got in the fit.
+"""
+import numpy as np
+
+from centroid_scorer import CentroidScorer
+
+# above this many customers the quadratic models switch to "sample" mode
+SCALABLE_ABOVE = 20_000
+SAMPLE_SIZE = 10_000
+STRATA_BINS = 4
+
+
+def resolve_mode(mode, n_rows, scalable_above=SCALABLE_ABOVE):
+    """'auto' -> 'sample' above `scalable_above` rows, else 'full'."""
+    if mode not in ("auto", "full", "sample"):
+        raise ValueError(f"Unknown cluster mode: {mode}")
+    if mode == "auto":
+        return "sample" if n_rows > scalable_above else "full"
+    return mode
+
+
+def stratified_sample(X, size, bins=STRATA_BINS, seed=42):
+    """
+    Sorted row indices of a ~`size` sample, stratified on per-feature
+    quantile bins (bins ** n_features strata, proportional allocation,
+    at least one row from every non-empty stratum so small extreme
+    segments such as top spenders are represented).
+    """
+    X = np.asarray(X)
+    n = len(X)
+    if size >= n:
+        return np.arange(n)
+
+    strata = np.zeros(n, dtype="int64")
+    for j in range(X.shape[1]):
+        edges = np.quantile(X[:, j], np.linspace(0, 1, bins + 1)[1:-1])
+        strata = strata * bins + np.searchsorted(edges, X[:, j], side="right")
+
+    # random order within each stratum; keep the first `quota` rows of each
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(n), strata))
+    ordered = strata[order]
+    rank = np.arange(n) - np.searchsorted(ordered, ordered, side="left")
+    counts = np.bincount(strata)
+    quota = np.maximum(np.round(counts * size / n), counts > 0)
+    return np.sort(order[rank < quota[ordered]])
+
+
+def _sample(X, sample_size, seed):
+    X = np.asarray(X, dtype="float64")
+    idx = stratified_sample(X, sample_size, seed=seed)
+    return X, idx
+
+
+def fit_agglomerative(X, n_clusters, mode="auto", scalable_above=SCALABLE_ABOVE,
+                      sample_size=SAMPLE_SIZE, seed=42):
+    """Ward AgglomerativeClustering labels and {"mode", "fit_rows"}."""
+    from sklearn.cluster import AgglomerativeClustering
+
+    mode = resolve_mode(mode, len(X), scalable_above)
+    if mode == "full":
+        return AgglomerativeClustering(n_clusters=n_clusters).fit_predict(X), {
+            "mode": "full", "fit_rows": len(X)
+        }
+
+    X, idx = _sample(X, sample_size, seed)
+    sample_labels = AgglomerativeClustering(n_clusters=n_clusters).fit_predict(X[idx])
+    centers = np.vstack([X[idx][sample_labels == c].mean(axis=0) for c in range(n_clusters)])
+
+    labels = CentroidScorer(centers).predict(X)
+    labels[idx] = sample_labels
+    return labels, {"mode": "sample", "fit_rows": len(idx)}
+
+
+def fit_dbscan(X, eps=0.5, min_samples=5, mode="auto", scalable_above=SCALABLE_ABOVE,
+               sample_size=SAMPLE_SIZE, seed=42):
+    """
+    DBSCAN labels and {"mode", "fit_rows", "min_samples"}.
+
+    In sample mode `min_samples` is scaled by the sampling fraction (at
+    least 2) so a core point needs roughly the same density as in a full
+    fit; everything else joins the cluster of a core sample within eps.
+    """
+    from sklearn.cluster import DBSCAN
+    from sklearn.neighbors import NearestNeighbors
+
+    mode = resolve_mode(mode, len(X), scalable_above)
+    if mode == "full":
+        return DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X), {
+            "mode": "full", "fit_rows": len(X), "min_samples": min_samples
+        }
+
+    X, idx = _sample(X, sample_size, seed)
+    sample_min = max(2, int(round(min_samples * len(idx) / len(X))))
+    db = DBSCAN(eps=eps, min_samples=sample_min).fit(X[idx])
+
+    labels = np.full(len(X), -1, dtype="int64")
+    core = db.core_sample_indices_
+    if len(core):
+        nn = NearestNeighbors(n_neighbors=1).fit(X[idx][core])
+        dist, nearest = nn.kneighbors(X)
+        within = dist[:, 0] <= eps
+        labels[within] = db.labels_[core][nearest[within, 0]]
+    labels[idx] = db.labels_
+    return labels, {"mode": "sample", "fit_rows": len(idx), "min_samples": sample_min}
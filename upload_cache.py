@@ -0,0 +1,233 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from rfm_core import RFM_INPUT_COLUMNS
+from rfm_stream import iter_chunks
+from xlsx_stream import read_excel_streaming
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRNAME = ".cache"
+CACHE_SUFFIX = ".arrow"
+_META_KEY = b"rfm_source"
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-cache")
+
+
+# ============================
+# PATHS & FRESHNESS
+# ============================
+def cache_path_for(path):
+    """uploads/data.csv -> uploads/.cache/data.csv.arrow"""
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, CACHE_DIRNAME, name + CACHE_SUFFIX)
+
+
+def _source_signature(path):
+    st = os.stat(path)
+    return {"mtime": st.st_mtime, "size": st.st_size}
+
+
+def is_fresh(path):
+    """True when a cache exists and was built from the current raw file."""
+    cache = cache_path_for(path)
+    if not os.path.exists(cache):
+        return False
+    import pyarrow as pa
+
+    try:
+        with pa.memory_map(cache) as source:
+            schema = pa.ipc.open_file(source).schema
+        meta = json.loads((schema.metadata or {}).get(_META_KEY, b"{}"))
+        return meta == _source_signature(path)
+    except Exception:
+        return False
+
+
+# ============================
+# CONVERSION
+# ============================
+def _read_raw_columns(path):
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path, usecols=RFM_INPUT_COLUMNS)
+    if path.lower().endswith(".xlsx"):
+        return read_excel_streaming(path, usecols=RFM_INPUT_COLUMNS)
+    return pd.read_excel(path, usecols=RFM_INPUT_COLUMNS)
+
+
+def compact_dtypes(df):
+    """Tight dtypes for the RFM input columns, dates parsed once."""
+    out = pd.DataFrame(index=pd.RangeIndex(len(df)))
+
+    out["CustomerID"] = df["CustomerID"].values
+    if out["CustomerID"].dtype == object:
+        out["CustomerID"] = out["CustomerID"].astype("category")
+
+    inv = df["InvoiceNo"]
+    out["InvoiceNo"] = inv.astype("category") if inv.dtype == object else inv.values
+
+    # NaT for unparseable dates; clean_transactions drops them as bad_date
+    out["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], errors="coerce").values
+
+    qty = pd.to_numeric(df["Quantity"], errors="coerce")
+    int32 = np.iinfo(np.int32)
+    if qty.notna().all() and (qty % 1 == 0).all() and qty.between(int32.min, int32.max).all():
+        qty = qty.astype("int32")
+    out["Quantity"] = qty.values
+
+    # prices stay float64 so Amount (and Monetary) match the raw file exactly
+    out["UnitPrice"] = pd.to_numeric(df["UnitPrice"], errors="coerce").astype("float64").values
+    return out
+
+
+def _chunk_schema(chunk, metadata):
+    """
+    Fixed schema for a chunked build. Categories and int32 quantities are
+    per-chunk decisions, so ids and invoices stay plain and numbers float64.
+    """
+    import pyarrow as pa
+
+    numeric_ids = chunk["CustomerID"].dtype.kind in "iuf"
+    return pa.schema([
+        ("CustomerID", pa.float64() if numeric_ids else pa.string()),
+        ("InvoiceNo", pa.string()),
+        ("InvoiceDate", pa.timestamp("ns")),
+        ("Quantity", pa.float64()),
+        ("UnitPrice", pa.float64()),
+    ], metadata=metadata)
+
+
+def _chunk_frame(chunk, schema):
+    import pyarrow as pa
+
+    cust = chunk["CustomerID"]
+    if pa.types.is_floating(schema.field("CustomerID").type):
+        # a later chunk with non-numeric ids fails the build (no cache)
+        cust = pd.to_numeric(cust, errors="raise").astype("float64")
+    else:
+        cust = cust.where(cust.isna(), cust.astype(str))
+    inv = chunk["InvoiceNo"]
+    return pd.DataFrame({
+        "CustomerID": cust.values,
+        "InvoiceNo": inv.where(inv.isna(), inv.astype(str)).values,
+        "InvoiceDate": pd.to_datetime(chunk["InvoiceDate"], errors="coerce").values,
+        "Quantity": pd.to_numeric(chunk["Quantity"], errors="coerce").astype("float64").values,
+        "UnitPrice": pd.to_numeric(chunk["UnitPrice"], errors="coerce").astype("float64").values,
+    })
+
+
+def _write_chunked(path, tmp, metadata, chunksize):
+    import pyarrow as pa
+
+    writer = None
+    try:
+        for chunk in iter_chunks(path, chunksize):
+            if writer is None:
+                schema = _chunk_schema(chunk, metadata)
+                writer = pa.ipc.new_file(tmp, schema)
+            frame = _chunk_frame(chunk, schema)
+            writer.write_batch(pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("no rows to cache")
+
+
+def build_cache(path, chunksize=None):
+    """
+    Convert a raw upload to an uncompressed Arrow IPC file next to it.
+
+    With `chunksize`, CSV/.xlsx uploads are converted that many rows at a
+    time (see _chunk_schema) so large files are never fully in memory.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    metadata = {_META_KEY: json.dumps(_source_signature(path)).encode()}
+    cache = cache_path_for(path)
+    os.makedirs(os.path.dirname(cache), exist_ok=True)
+    tmp = cache + ".tmp"
+
+    if chunksize and path.lower().endswith((".csv", ".xlsx")):
+        _write_chunked(path, tmp, metadata, chunksize)
+    else:
+        df = compact_dtypes(_read_raw_columns(path))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        # uncompressed so readers can memory-map it
+        feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, cache)
+    return cache
+
+
+def _build_quietly(path, chunksize=None):
+    try:
+        return build_cache(path, chunksize)
+    except Exception:
+        logger.exception("Failed to build columnar cache for %s", path)
+        return None
+
+
+def build_cache_async(path, chunksize=None):
+    """Schedule cache conversion in the background; returns a Future."""
+    return _executor.submit(_build_quietly, path, chunksize)
+
+
+# ============================
+# READING
+# ============================
+def load_cached(path, columns=None):
+    """Memory-mapped read of the cache, or None when missing or stale."""
+    if not is_fresh(path):
+        return None
+    import pyarrow.feather as feather
+
+    table = feather.read_table(cache_path_for(path), columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def cached_num_rows(path):
+    """Row count of a fresh cache (metadata only), or None."""
+    if not is_fresh(path):
+        return None
+    import pyarrow as pa
+
+    with pa.memory_map(cache_path_for(path)) as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def _batches_as_frames(cache, chunksize):
+    import pyarrow as pa
+
+    with pa.memory_map(cache) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, chunksize):
+                yield batch.slice(start, chunksize).to_pandas()
+
+
+def iter_cached_chunks(path, chunksize=100_000):
+    """DataFrames of at most `chunksize` cached rows, or None when missing or stale."""
+    if not is_fresh(path):
+        return None
+    return _batches_as_frames(cache_path_for(path), chunksize)
+
+
+def load_transactions(path, columns=None):
+    """Cached RFM columns when available, else the raw CSV/Excel file."""
+    df = load_cached(path, columns)
+    if df is not None:
+        return df
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path, usecols=columns)
+    if path.lower().endswith(".xlsx"):
+        return read_excel_streaming(path, usecols=columns)
+    return pd.read_excel(path, usecols=columns)
@@ -0,0 +1,77 @@
+import pandas as pd
+
+from rfm_core import RFM_INPUT_COLUMNS
+
+
+def _type_chunk(df):
+    """Give the RFM columns stable dtypes so chunks concatenate cleanly."""
+    if "CustomerID" in df:
+        df["CustomerID"] = pd.to_numeric(df["CustomerID"], errors="ignore")
+    if "InvoiceNo" in df:
+        df["InvoiceNo"] = df["InvoiceNo"].map(lambda v: v if v is None else str(v))
+    if "InvoiceDate" in df:
+        # unparseable cells become NaT, dropped by clean_transactions (bad_date)
+        df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], errors="coerce")
+    for col in ("Quantity", "UnitPrice"):
+        if col in df:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df.infer_objects()
+
+
+def iter_excel_chunks(path, sheet_name=None, usecols=None, chunksize=50_000):
+    """
+    Yield typed DataFrame chunks from an .xlsx sheet using openpyxl's
+    read-only row streaming, without building the workbook object model.
+
+    sheet_name: sheet title or index (default: first sheet, like read_excel)
+    usecols: header names to keep (default: all)
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        if sheet_name is None or isinstance(sheet_name, int):
+            ws = wb.worksheets[sheet_name or 0]
+        else:
+            ws = wb[sheet_name]
+
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+
+        if usecols is None:
+            idx = list(range(len(header)))
+        else:
+            missing = [c for c in usecols if c not in header]
+            if missing:
+                raise ValueError(f"Columns not found in sheet: {missing}")
+            idx = [header.index(c) for c in usecols]
+        columns = [header[i] for i in idx]
+
+        buffer = []
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            buffer.append(tuple(row[i] if i < len(row) else None for i in idx))
+            if len(buffer) >= chunksize:
+                yield _type_chunk(pd.DataFrame.from_records(buffer, columns=columns))
+                buffer = []
+        if buffer:
+            yield _type_chunk(pd.DataFrame.from_records(buffer, columns=columns))
+    finally:
+        wb.close()
+
+
+def read_excel_streaming(path, sheet_name=None, usecols=None, chunksize=50_000):
+    """Whole sheet as one DataFrame, read through iter_excel_chunks."""
+    chunks = list(iter_excel_chunks(path, sheet_name, usecols, chunksize))
+    if not chunks:
+        return pd.DataFrame(columns=usecols or [])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_excel_rfm_columns(path, sheet_name=None, chunksize=50_000):
+    """Only the columns the RFM pipeline needs."""
+    return read_excel_streaming(path, sheet_name, RFM_INPUT_COLUMNS, chunksize)